@@ -0,0 +1,166 @@
+# run_benchmarks.py
+"""Time and memory-profile every pipeline stage on synthetic data across size tiers.
+
+Usage: python benchmarks/run_benchmarks.py [--tiers=small,medium] [--output=results.json]
+                                          [--compare=previous.json]
+
+Results are written as JSON (one record per tier and stage) so runs on different
+commits can be compared; --compare prints the time/memory ratio against an earlier run.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic_data import make_roster, make_work_packages, make_source_timesheet, make_target_sheet  # noqa: E402
+from dataProcessor import TimeSheetUpdater  # noqa: E402
+from chunk_handler import ChunkHandler  # noqa: E402
+from updater import EmployeeCostMapper  # noqa: E402
+from name_mappings import SKIP_NAMES  # noqa: E402
+
+TIERS = {
+    'small': {'employees': 10, 'operations': 4, 'months': 12, 'rows': 2_000},
+    'medium': {'employees': 40, 'operations': 20, 'months': 24, 'rows': 20_000},
+    'large': {'employees': 120, 'operations': 80, 'months': 36, 'rows': 150_000},
+}
+
+
+@contextmanager
+def measure(results, stage):
+    """Record wall time and peak traced memory of the enclosed block under results[stage].
+
+    tracemalloc only sees the current process, so work done in process pools
+    (e.g. chunk writing) shows up in the time but not in peak_mb.
+    """
+    record = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+        results[stage] = record
+
+
+def run_tier(name, config, workdir):
+    """Generate one tier's inputs in workdir and benchmark each stage on them."""
+    docs_dir = os.path.join(workdir, "docs")
+    os.makedirs(docs_dir, exist_ok=True)
+    source_path = os.path.join(docs_dir, "source_timesheet.xlsx")
+    target_path = os.path.join(docs_dir, "target_sheet.xlsx")
+
+    roster = make_roster(config['employees'])
+    work_packages = make_work_packages(config['operations'])
+    make_source_timesheet(source_path, work_packages, roster, config['months'], config['rows'])
+    make_target_sheet(target_path, work_packages, roster, config['months'])
+
+    # The stages write to ../chunks relative to the working directory
+    run_dir = os.path.join(workdir, "src")
+    os.makedirs(run_dir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(run_dir)
+    results = {}
+    try:
+        updater = TimeSheetUpdater()
+        updater.work_package_to_operation = work_packages
+        with measure(results, 'load_and_process_data') as record:
+            processed = updater.load_and_process_data(source_path, use_cache=False, save_chunks=False)
+            record['rows'] = len(processed)
+        processed_df = updater.process_all_chunks()
+
+        with measure(results, 'save_chunks') as record:
+            handler = ChunkHandler(processed, updater.normalize_name)
+            record['rows'] = sum(r['rows'] for r in handler.save_chunks("../chunks/processed_chunks", "processed"))
+
+        mapper = EmployeeCostMapper(target_path, None, 'Project', SKIP_NAMES, processed_df=processed_df)
+        with measure(results, 'map_employees') as record:
+            mapper.map_employees()
+            record['rows'] = len(mapper.cell_audit_log)
+
+        with measure(results, 'update_costs') as record:
+            mapper.update_costs()
+            record['rows'] = len(mapper.cell_audit_log)
+
+        audit_df = mapper.audit_frame()
+        # Imported outside the measured block so its import cost is not counted
+        from analyst import build_cost_cube, summarize_operations_employees, average_spent_per_month
+        with measure(results, 'analyst_aggregation') as record:
+            cube = build_cost_cube(audit_df)
+            summarize_operations_employees(audit_df, cube)
+            average_spent_per_month(audit_df, cube)
+            record['rows'] = len(cube)
+    finally:
+        os.chdir(cwd)
+    return {'tier': name, 'config': config, 'stages': results}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path):
+    """Print current/baseline ratios for every stage present in both reports."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(t['tier'], stage): record for t in baseline['tiers'] for stage, record in t['stages'].items()}
+    print(f"Compared with {baseline_path} (commit {baseline.get('commit')}):")
+    for tier in report['tiers']:
+        for stage, record in tier['stages'].items():
+            old = previous.get((tier['tier'], stage))
+            if not old:
+                continue
+            time_ratio = record['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+            mem_ratio = record['peak_mb'] / old['peak_mb'] if old['peak_mb'] else float('nan')
+            print(f"  {tier['tier']:<7} {stage:<22} time x{time_ratio:.2f}  memory x{mem_ratio:.2f}")
+
+
+def main(argv):
+    tiers = ['small', 'medium']
+    output = None
+    baseline = None
+    for arg in argv:
+        if arg.startswith('--tiers='):
+            tiers = arg.split('=', 1)[1].split(',')
+        elif arg.startswith('--output='):
+            output = arg.split('=', 1)[1]
+        elif arg.startswith('--compare='):
+            baseline = arg.split('=', 1)[1]
+    output = output or os.path.join(BENCH_DIR, "results", f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tiers': [],
+    }
+    for name in tiers:
+        print(f"Benchmarking tier '{name}': {TIERS[name]}")
+        with tempfile.TemporaryDirectory() as workdir:
+            tier_result = run_tier(name, TIERS[name], workdir)
+        for stage, record in tier_result['stages'].items():
+            print(f"  {stage:<22} {record['seconds']:>9.3f}s  {record['peak_mb']:>9.2f} MB  rows={record.get('rows')}")
+        report['tiers'].append(tier_result)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to: {output}")
+    if baseline:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+# startup_time.py
+"""Measure the import cost of each CLI command in a fresh interpreter.
+
+Usage: python benchmarks/startup_time.py [--repeat=5] [--output=results.json]
+
+Every command is loaded (cli.load_command, which imports what the command needs
+but does not run it) in a new Python process, several times. The report holds the
+fastest import time, the fastest whole-process time and which heavy plotting/LLM
+modules ended up imported, so a regression such as 'process' pulling in
+matplotlib shows up directly.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "src"))
+
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'langchain_core', 'langchain_ollama')
+
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import cli
+cli.load_command({command!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{'import_s': elapsed, 'heavy': sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def measure_command(command, repeat):
+    """Fastest import and process times of one command over repeat fresh interpreters."""
+    import_times, process_times = [], []
+    heavy = None
+    env = dict(os.environ, MPLBACKEND='Agg')
+    for _ in range(repeat):
+        code = SNIPPET.format(src=SRC_DIR, command=command, heavy=HEAVY_MODULES)
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             cwd=SRC_DIR, env=env).stdout
+        process_times.append(time.perf_counter() - start)
+        result = json.loads(out.strip().splitlines()[-1])
+        import_times.append(result['import_s'])
+        heavy = result['heavy']
+    return {
+        'command': command,
+        'import_s': round(min(import_times), 4),
+        'process_s': round(min(process_times), 4),
+        'heavy_modules': heavy,
+    }
+
+
+def main(argv):
+    repeat = 5
+    output = None
+    for arg in argv:
+        if arg.startswith('--repeat='):
+            repeat = int(arg.split('=', 1)[1])
+        elif arg.startswith('--output='):
+            output = arg.split('=', 1)[1]
+    output = output or os.path.join(BENCH_DIR, "results", f"startup_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+    sys.path.insert(0, SRC_DIR)
+    from cli import COMMAND_MODULES
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'commands': []}
+    for command in COMMAND_MODULES:
+        record = measure_command(command, repeat)
+        heavy = ", ".join(record['heavy_modules']) or "none"
+        print(f"  {command:<8} import {record['import_s']:>7.3f}s  process {record['process_s']:>7.3f}s  "
+              f"heavy modules: {heavy}")
+        report['commands'].append(record)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Startup results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
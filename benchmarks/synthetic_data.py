@@ -0,0 +1,103 @@
+# synthetic_data.py
+"""Generators for synthetic source timesheets and 'Project' target sheets."""
+import datetime
+import os
+import random
+import sys
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from name_mappings import NAME_MAP  # noqa: E402
+
+WORK_PACKAGE_KINDS = ['PM/CM', 'Testcenter', 'Integrations']
+
+
+def make_roster(num_employees, seed=0):
+    """Canonical names with their aliases: NAME_MAP first, then generated names."""
+    rng = random.Random(seed)
+    roster = {}
+    for canonical, aliases in list(NAME_MAP.items())[:num_employees]:
+        roster[canonical] = list(aliases)
+    for i in range(len(roster), num_employees):
+        surname, first = f"Surname{i}", f"First{i}"
+        canonical = f"{surname}, {first}"
+        roster[canonical] = [canonical, f"{first} {surname}"]
+        if rng.random() < 0.3:
+            roster[canonical].append(f"{surname}, {first} (ext)")
+    return roster
+
+
+def make_work_packages(num_operations):
+    """Work package label -> operation name, three packages per operation."""
+    mapping = {}
+    for op in range(num_operations):
+        operation = f"Operation {op:03d} Crew"
+        for k, kind in enumerate(WORK_PACKAGE_KINDS):
+            mapping[f"{op * 3 + k:03d} / {operation} - {kind}"] = operation
+    return mapping
+
+
+def month_starts(num_months, start=datetime.datetime(2024, 1, 1)):
+    months = []
+    year, month = start.year, start.month
+    for _ in range(num_months):
+        months.append(datetime.datetime(year, month, 1))
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+def make_source_timesheet(path, work_packages, roster, num_months, num_rows, unmapped_share=0.05, seed=0):
+    """Write a source timesheet with Work Package/Name/Period/Fees and a few noise columns."""
+    rng = random.Random(seed)
+    packages = list(work_packages)
+    names = [alias for aliases in roster.values() for alias in aliases]
+    months = month_starts(num_months)
+    rows = {'Work Package': [], 'Name': [], 'Period': [], 'Fees': [], 'Hours': [], 'Comment': []}
+    for _ in range(num_rows):
+        package = f"999 / Unmapped - {rng.randint(1, 5)}" if rng.random() < unmapped_share else rng.choice(packages)
+        rows['Work Package'].append(package)
+        rows['Name'].append(rng.choice(names))
+        rows['Period'].append(rng.choice(months) + datetime.timedelta(days=rng.randint(0, 27)))
+        rows['Fees'].append(round(rng.uniform(0, 800), 2))
+        rows['Hours'].append(round(rng.uniform(0, 8), 1))
+        rows['Comment'].append("synthetic")
+    pd.DataFrame(rows).to_excel(path, index=False)
+
+
+def make_target_sheet(path, work_packages, roster, num_months, sheet_name='Project', seed=0):
+    """Write a target workbook laid out like the real 'Project' sheet.
+
+    Row 1 holds month headers from column F; column E lists each operation followed
+    by its employee rows (under random aliases) and a skipped 'Total costs' row,
+    and the sheet ends with 'Accumulated Total'.
+    """
+    rng = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    months = month_starts(num_months)
+    for offset, month in enumerate(months):
+        ws.cell(row=1, column=6 + offset, value=month)
+    row = 2
+    for operation in sorted(set(work_packages.values())):
+        ws.cell(row=row, column=5, value=operation)
+        first_row = row + 1
+        row += 1
+        for aliases in roster.values():
+            ws.cell(row=row, column=5, value=rng.choice(aliases))
+            for offset in range(num_months):
+                ws.cell(row=row, column=6 + offset, value=rng.randint(0, 500))
+            row += 1
+        ws.cell(row=row, column=5, value="Total costs")
+        for offset in range(num_months):
+            col = 6 + offset
+            letter = ws.cell(row=1, column=col).column_letter
+            ws.cell(row=row, column=col, value=f"=SUM({letter}{first_row}:{letter}{row - 1})")
+        row += 1
+    ws.cell(row=row, column=5, value="Accumulated Total")
+    wb.save(path)
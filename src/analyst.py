@@ -1,28 +1,75 @@
+import os
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama.llms import OllamaLLM
-
-
-def summarize_operations_employees(df):
-    summary = []
-    operations = df['Operation'].unique()
-    for op in operations:
-        op_df = df[df['Operation'] == op]
-        employees = op_df['Employee'].unique()
-        total_cost = op_df['Fees_after'].sum()
-        min_cost_row = op_df.loc[op_df['Fees_after'].idxmin()]
-        summary.append({
-            'Operation': op,
-            'NumEmployees': len(employees),
-            'TotalCost': total_cost,
-            'LowestCostEmployee': min_cost_row['Employee'],
-            'LowestCost': min_cost_row['Fees_after']
-        })
-    return pd.DataFrame(summary)
+
+from audit_loader import load_audit_chunks
+from instrumentation import logger
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHUNKS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../chunks/target_chunks"))
+
+
+CUBE_KEYS = ['Operation', 'Employee', 'Month']
+FEE_COLUMNS = ['Fees_before', 'Fees_after']
+
+
+def build_cost_cube(df):
+    """Aggregate the audit data to one row per (Operation, Employee, Month).
+
+    -1 sentinels (missing fees) are masked before aggregating, so the
+    <fee>_sum/_mean/_min/_count columns only cover real values; Cells counts
+    every audit row, masked or not.
+    """
+    fees = df[FEE_COLUMNS].where(df[FEE_COLUMNS] != -1)
+    grouped = pd.concat([df[CUBE_KEYS], fees], axis=1).groupby(CUBE_KEYS, observed=True, sort=True)
+    cube = grouped.agg(['sum', 'mean', 'min', 'count'])
+    cube.columns = [f"{col}_{stat}" for col, stat in cube.columns]
+    cube['Cells'] = grouped.size()
+    return cube
+
+
+def lowest_cost_employees(cube):
+    """Per operation, the employee/month cell with the lowest Fees_after."""
+    cells = cube.reset_index()
+    cells = cells[cells['Fees_after_count'] > 0]
+    lowest = (
+        cells.sort_values('Fees_after_min', kind='stable')
+        .drop_duplicates('Operation')
+        .set_index('Operation')
+    )
+    return lowest[['Employee', 'Month', 'Fees_after_min']].rename(columns={'Fees_after_min': 'LowestCost'})
+
+
+def summarize_operations_employees(df, cube=None):
+    """Per operation: employee count, total cost and the lowest-cost employee.
+
+    :param cube: result of build_cost_cube(df), if already computed
+    """
+    if cube is None:
+        cube = build_cost_cube(df)
+    cells = cube.reset_index()
+    by_op = cells.groupby('Operation', observed=True)
+    summary = pd.DataFrame({
+        'NumEmployees': by_op['Employee'].nunique(),
+        'TotalCost': by_op['Fees_after_sum'].sum(),
+    })
+    lowest = lowest_cost_employees(cube)
+    summary['LowestCostEmployee'] = lowest['Employee']
+    summary['LowestCost'] = lowest['LowestCost']
+    return summary.reset_index()
+
+def average_spent_per_month(df, cube=None):
+    """Average Fees_after per operation and month, ignoring missing (-1) cells.
+
+    :param cube: result of build_cost_cube(df), if already computed
+    """
+    if cube is None:
+        cube = build_cost_cube(df)
+    by_month = cube.groupby(level=['Operation', 'Month'], observed=True)[['Fees_after_sum', 'Fees_after_count']].sum()
+    by_month = by_month[by_month['Fees_after_count'] > 0]
+    average = (by_month['Fees_after_sum'] / by_month['Fees_after_count']).rename('AverageSpent')
+    return average.reset_index()
 
 def analysis_prompt(summary_df):
     prompt = (
@@ -37,96 +84,102 @@ def analysis_prompt(summary_df):
     )
     return prompt
 
-if __name__ == "__main__":
-    import glob
-    import os
-
-    # Directory containing audit chunk files
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    CHUNKS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../chunks/target_chunks"))
-
-    # Find all Excel files in the chunks directory
-    chunk_files = glob.glob(os.path.join(CHUNKS_DIR, "*.xlsx"))
-    print(f"Found {len(chunk_files)} chunk files:")
-    for f in chunk_files:
-        print(f"  - {os.path.basename(f)}")
-
-    # Load each chunk into a DataFrame
-    chunk_dfs = []
-    for file in chunk_files:
-        try:
-            df = pd.read_excel(file)
-            chunk_dfs.append(df)
-        except Exception as e:
-            print(f"Failed to load {file}: {e}")
-
-    print(f"Loaded {len(chunk_dfs)} chunk DataFrames.")
-
-    # Combine all chunk DataFrames into one
-    if chunk_dfs:
-        all_chunks_df = pd.concat(chunk_dfs, ignore_index=True)
+def plot_average_spent(avg_spent_per_month, output_path=None):
+    """Line plot of the average spent per operation and month.
+
+    Shown in a window, or rendered with the Agg backend and saved when output_path is given.
+    """
+    # The plotting stack is only needed here, so it is not imported with the module
+    import matplotlib
+    if output_path:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12, 7))
+    sns.lineplot(data=avg_spent_per_month, x='Month', y='AverageSpent', hue='Operation', marker='o')
+    plt.title("Average Spent per Operation per Month")
+    plt.xlabel("Month")
+    plt.ylabel("Average Fees Spent (€)")
+    plt.xticks(rotation=45)
+    plt.legend(title='Operation', bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.tight_layout()
+    if output_path:
+        plt.savefig(output_path)
+        plt.close()
+        logger.info(f"Plot saved to: {output_path}")
     else:
-        print("No chunk data loaded. Exiting.")
-        exit(1)
+        plt.show()
 
-    # summary_df = summarize_operations_employees(all_chunks_df)
 
-    # Create the analysis prompt using the summary
-    # prompt_text = analysis_prompt(summary_df)
+def run_analysis(argv):
+    """Load the audit chunks and compute the summary and monthly averages.
 
-    # summary_df_str = summary_df.to_string(index=False)
-    # Use the language model to generate insights
-    # template = """
-    #     ### Context
-    #     You are given data on operations and employee fees from an organizational setting. The dataset includes anonymized information such as operation names, employee identities, fees related to employee participation in operations, and total costs associated with each operation.
+    Flags: --no-cache, --insights (local Ollama model), --fake-llm (offline stand-in).
+    With --history[=<db path>] the results are queried from the history store instead
+    (--run=<id> picks a run, default the latest update; --operation=<name> filters).
 
-    #     ### Task
-    #     Your task is to analyze the provided summary of operational costs and employee contributions. The goal is to extract key insights about financial distribution and personnel involvement. 
+    :return: (summary, avg_spent_per_month), or None when no data was found
+    """
+    from cli import history_option
 
-    #     ### Insights Required
-    #     1. **Financial Analysis**:
-    #     - Identify the operations with the highest and lowest total costs.
-    #     - Discuss notable differences in cost distribution across operations.
+    use_cache = '--no-cache' not in argv
+    store = history_option(argv)
+    if store is not None:
+        summary_df, avg_spent = _query_history(store, argv)
+        if summary_df.empty:
+            logger.info("No audit data in the history store. Exiting.")
+            return None
+    else:
+        # Load all chunks in parallel (or from the consolidated audit store if unchanged)
+        all_chunks_df = load_audit_chunks(CHUNKS_DIR, use_store=use_cache)
+        if all_chunks_df.empty:
+            logger.info("No chunk data loaded. Exiting.")
+            return None
 
-    #     2. **Personnel Impact**:
-    #     - Highlight employees with the lowest costs per operation.
-    #     - Describe potential reasons for cost discrepancies.
+        cube = build_cost_cube(all_chunks_df)
+        summary_df = summarize_operations_employees(all_chunks_df, cube)
+        # Compute average spent for each operation per month
+        avg_spent = average_spent_per_month(all_chunks_df, cube)
 
-    #     3. **Patterns and Anomalies**:
-    #     - Pinpoint any unusual patterns in operations or costs that could indicate inefficiencies or areas for improvement.
+    # Use the language model to generate insights, one prompt per operation
+    if '--insights' in argv or '--fake-llm' in argv:
+        from insights import FakeLLM, OllamaBackend, ResponseCache, generate_insights
 
-    #     4. **Recommendations**:
-    #     - Suggest steps to optimize expenses and improve employee participation efficiency.
+        backend = FakeLLM() if '--fake-llm' in argv else OllamaBackend(model="mistral:latest", temperature=0.3)
+        cache = ResponseCache() if use_cache else None
+        results = generate_insights(summary_df, backend, analysis_prompt, cache=cache)
 
-    #     ### Analysis Output
-    #     Based on the above context and data summary, provide a comprehensive analysis with insights and recommendations.
-    #     """
-    # prompt = ChatPromptTemplate.from_template(template)
+        logger.info("Insights about Operations and Fees:")
+        for operation, result in results.items():
+            logger.info(f"\n## {operation}\n{result}")
 
-    # model = OllamaLLM(model="mistral:latest", temperature=0.3)
+    return summary_df, avg_spent
 
-    # chain = prompt | model
 
-    # result = chain.invoke({"question": prompt_text})
+def _query_history(store, argv):
+    """Summary and monthly averages aggregated inside the history store (filters pushed down)."""
+    from cli import flag
 
-    # print("Insights about Operations and Fees:")
-    # print(result)
+    run = flag(argv, 'run')
+    run_id = int(run) if run else None
+    operations = [arg.split('=', 1)[1] for arg in argv if arg.startswith('--operation=')] or None
+    return (store.summarize_operations(run_id, operations),
+            store.average_spent_per_month(run_id, operations))
 
-    # Compute average spent for each operation per month
-    avg_spent_per_month = (
-        all_chunks_df[all_chunks_df['Fees_after'] != -1]
-        .groupby(['Operation', 'Month'])
-        .agg(AverageSpent=('Fees_after', 'mean'))
-        .reset_index()
-    )
 
-    # Plot the average spent for each operation per month
-    plt.figure(figsize=(12, 7))
-    sns.lineplot(data=avg_spent_per_month, x='Month', y='AverageSpent', hue='Operation', marker='o')
-    plt.title("Average Spent per Operation per Month")
-    plt.xlabel("Month")
-    plt.ylabel("Average Fees Spent (€)")
-    plt.xticks(rotation=45)
-    plt.legend(title='Operation', bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    plt.show()
\ No newline at end of file
+def main(argv=None):
+    import sys
+    from cli import flag
+    from instrumentation import configure
+
+    argv = sys.argv if argv is None else argv
+    configure()
+    results = run_analysis(argv)
+    if results is None:
+        sys.exit(1)
+    plot_average_spent(results[1], flag(argv, 'plot-output'))
+
+
+if __name__ == "__main__":
+    main()
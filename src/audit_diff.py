@@ -0,0 +1,150 @@
+# audit_diff.py
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunk_writer import write_chunk
+from instrumentation import logger, span
+
+KEY_COLUMNS = ['Operation', 'Employee', 'Month']
+DIFF_COLUMNS = KEY_COLUMNS + ['Cell', 'Status', 'Fees_old', 'Fees_new', 'Delta']
+DEFAULT_OUTPUT_PATH = "../reports/diff/changes.csv"
+
+
+def _keyed(df, value):
+    """Key columns as plain strings, the cell, the fee (-1 and text as missing) and an occurrence number.
+
+    The occurrence number pairs up repeated keys (an employee listed twice in one
+    section) in order, instead of matching every copy against every other.
+    """
+    keyed = pd.DataFrame({col: df[col].astype(str).str.strip().to_numpy() for col in KEY_COLUMNS})
+    keyed['Cell'] = df['Cell'].to_numpy() if 'Cell' in df.columns else None
+    fees = pd.to_numeric(df[value], errors='coerce').to_numpy(dtype='float64')
+    keyed['Fees'] = np.where(fees == -1, np.nan, fees)
+    keyed['_occurrence'] = keyed.groupby(KEY_COLUMNS, sort=False).cumcount().to_numpy()
+    return keyed
+
+
+def diff_audits(old_df, new_df, old_value='Fees_after', new_value='Fees_after', tolerance=0.0):
+    """Cells whose fee differs between two audit frames, keyed by (Operation, Employee, Month).
+
+    Works on any frame with the audit layout (EmployeeCostMapper.audit_frame(), the
+    audit chunks, HistoryStore.audit_frame() or sheet_frame()). A missing key, a -1
+    sentinel and a non-numeric value all count as 'no fee'.
+
+    :param old_value: fee column of old_df to compare
+    :param new_value: fee column of new_df to compare
+    :param tolerance: absolute difference below which two fees count as equal
+    :return: DataFrame with DIFF_COLUMNS, one row per 'changed', 'added' (fee only in
+        new) or 'removed' (fee only in old) cell; Delta is new - old, with a missing
+        fee counting as 0
+    """
+    with span('diff', rows_old=len(old_df), rows_new=len(new_df)) as record:
+        merged = _keyed(old_df, old_value).merge(
+            _keyed(new_df, new_value), on=KEY_COLUMNS + ['_occurrence'], how='outer', suffixes=('_old', '_new'))
+        old_fees = merged['Fees_old'].to_numpy()
+        new_fees = merged['Fees_new'].to_numpy()
+        has_old, has_new = ~np.isnan(old_fees), ~np.isnan(new_fees)
+        with np.errstate(invalid='ignore'):
+            changed = has_old & has_new & (np.abs(new_fees - old_fees) > tolerance)
+        status = np.select([changed, has_new & ~has_old, has_old & ~has_new], ['changed', 'added', 'removed'], '')
+        keep = status != ''
+
+        diff = merged.loc[keep, KEY_COLUMNS].reset_index(drop=True)
+        diff['Cell'] = merged['Cell_new'].where(merged['Cell_new'].notna(), merged['Cell_old'])[keep].to_numpy()
+        diff['Status'] = status[keep]
+        diff['Fees_old'] = old_fees[keep]
+        diff['Fees_new'] = new_fees[keep]
+        diff['Delta'] = np.nan_to_num(new_fees[keep]) - np.nan_to_num(old_fees[keep])
+        diff = diff.sort_values(KEY_COLUMNS, kind='stable', ignore_index=True)[DIFF_COLUMNS]
+        record['rows'] = len(diff)
+    return diff
+
+
+def summarize_changes(diff_df):
+    """Per operation: number of changed/added/removed cells and the net fee delta."""
+    counts = pd.crosstab(diff_df['Operation'], diff_df['Status'])
+    counts = counts.reindex(columns=['changed', 'added', 'removed'], fill_value=0)
+    counts['Delta'] = diff_df.groupby('Operation')['Delta'].sum()
+    return counts.reset_index()
+
+
+def sheet_frame(path, sheet='Project', processed_df=None, processed_path=None, skip_names=None):
+    """The fees of a target sheet version in the audit layout (Fees_before = the cell values).
+
+    The sheet is mapped like EmployeeCostMapper.map_employees does, so the processed
+    data is needed for the operation names that delimit its sections.
+    """
+    from updater import EmployeeCostMapper
+    from name_mappings import SKIP_NAMES
+
+    mapper = EmployeeCostMapper(path, processed_path, sheet, SKIP_NAMES if skip_names is None else skip_names,
+                                read_only=True, processed_df=processed_df)
+    mapper.map_employees()
+    mapper.wb.close()
+    return mapper.cell_audit_log.to_frame()
+
+
+def log_changes(diff_df):
+    if diff_df.empty:
+        logger.info("No changed cells.")
+        return
+    counts = diff_df['Status'].value_counts()
+    logger.info(f"{len(diff_df)} cells differ: " + ", ".join(f"{counts.get(s, 0)} {s}" for s in ('changed', 'added', 'removed')))
+    for row in summarize_changes(diff_df).itertuples(index=False):
+        logger.info(f"  - {row.Operation}: {row.changed} changed, {row.added} added, {row.removed} removed, "
+                    f"net {row.Delta:+.2f}")
+
+
+def main(argv=None):
+    # Usage: python audit_diff.py <old.xlsx> <new.xlsx> [--sheet=Project]   two versions of a target sheet
+    #        python audit_diff.py --old-chunks=<dir> --new-chunks=<dir>     two sets of audit chunks
+    #        python audit_diff.py --history[=<db>] [--old-run=<id>] [--new-run=<id>]   two recorded update runs
+    #        [--processed=<xlsx>] [--tolerance=0] [--output=<csv|xlsx|parquet|feather>]
+    import sys
+    from cli import flag, history_option
+    from instrumentation import configure
+
+    argv = sys.argv if argv is None else argv
+    configure()
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    tolerance = float(flag(argv, 'tolerance', 0.0))
+    paths = [arg for arg in argv[1:] if not arg.startswith('--')]
+    store = history_option(argv)
+    if store is not None:
+        update_runs = store.list_runs().query("stage == 'update'")['id'].tolist()
+        new_run = int(flag(argv, 'new-run', update_runs[-1] if update_runs else 0))
+        older = [run for run in update_runs if run < new_run]
+        old_run = int(flag(argv, 'old-run', older[-1] if older else 0))
+        if not old_run or not new_run:
+            logger.info("Need two recorded update runs to compare. Exiting.")
+            return 1
+        logger.info(f"Comparing update run {old_run} with run {new_run}")
+        diff = diff_audits(store.audit_frame(old_run), store.audit_frame(new_run), tolerance=tolerance)
+    elif flag(argv, 'old-chunks') and flag(argv, 'new-chunks'):
+        from audit_loader import load_audit_chunks
+        diff = diff_audits(load_audit_chunks(flag(argv, 'old-chunks'), use_store=False),
+                           load_audit_chunks(flag(argv, 'new-chunks'), use_store=False), tolerance=tolerance)
+    elif len(paths) == 2:
+        from frame_cache import read_excel_cached
+        processed_path = os.path.abspath(os.path.join(BASE_DIR, "../docs/processed_timesheet.xlsx"))
+        processed_df = read_excel_cached(flag(argv, 'processed', processed_path), use_cache='--no-cache' not in argv)
+        sheet = flag(argv, 'sheet', "Project")
+        diff = diff_audits(sheet_frame(paths[0], sheet, processed_df), sheet_frame(paths[1], sheet, processed_df),
+                           old_value='Fees_before', new_value='Fees_before', tolerance=tolerance)
+    else:
+        print("Usage: python audit_diff.py <old.xlsx> <new.xlsx> | --old-chunks=<dir> --new-chunks=<dir> "
+              "| --history[=<db>] [--old-run=<id>] [--new-run=<id>]")
+        return 2
+
+    log_changes(diff)
+    output = flag(argv, 'output', DEFAULT_OUTPUT_PATH)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    write_chunk(diff, output, os.path.splitext(output)[1].lstrip('.') or 'csv')
+    logger.info(f"Saved change report to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# audit_loader.py
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from chunk_writer import write_chunk
+from file_utils import atomic_path
+from instrumentation import logger
+from schema import AUDIT_LABELS, compact_dtypes
+
+STORE_NAMES = {'feather': "audit_store.feather", 'pickle': "audit_store.pkl"}
+
+
+def store_format():
+    """'feather' (columnar, keeps the categorical dtypes) when pyarrow is installed, else 'pickle'."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'pickle'
+    return 'feather'
+
+
+def _read_store(path):
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    return pd.read_pickle(path)
+
+
+def _write_store(df, path):
+    if path.endswith('.feather'):
+        write_chunk(df, path, 'feather')
+        return
+    with atomic_path(path) as tmp_path:
+        df.to_pickle(tmp_path)
+
+
+def read_chunk(path):
+    """Read one chunk file, picking the reader from its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.xlsx':
+        return pd.read_excel(path)
+    if ext == '.csv':
+        return pd.read_csv(path)
+    if ext == '.parquet':
+        return pd.read_parquet(path)
+    if ext == '.feather':
+        return pd.read_feather(path)
+    raise ValueError(f"Unsupported chunk file: {path}")
+
+
+def _try_read_chunk(path):
+    try:
+        return read_chunk(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def compact_audit_dtypes(df):
+    """Categoricals for the repeated labels and int32 fees where the values allow it."""
+    return compact_dtypes(df, labels=AUDIT_LABELS)
+
+
+def list_chunk_files(chunks_dir):
+    """Chunk files listed in the directory's manifest, or every *.xlsx file without one."""
+    manifest_path = os.path.join(chunks_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            records = json.load(f).get('chunks', [])
+        return [os.path.join(chunks_dir, record['file']) for record in records]
+    return sorted(glob.glob(os.path.join(chunks_dir, "*.xlsx")))
+
+
+def _signature(files):
+    """Name, mtime and size of every chunk file; the store is stale when this changes."""
+    signature = []
+    for path in sorted(files):
+        stat = os.stat(path)
+        signature.append([os.path.basename(path), stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def load_audit_chunks(chunks_dir, max_workers=None, use_store=True, store_path=None):
+    """Load every audit chunk into one compact DataFrame.
+
+    Chunks are parsed in parallel in a process pool. The combined frame is kept in a
+    consolidated store next to the chunks and reused while the chunk files are
+    unchanged, so later loads skip parsing entirely. The store is a columnar
+    Feather file when pyarrow is installed and a pickle otherwise (see store_format).
+
+    :param use_store: read/write the consolidated store; False always re-parses the chunks
+    :param store_path: location of the store (default: audit_store.feather or
+        audit_store.pkl in chunks_dir); a '.feather' path is written as Feather
+    """
+    store_path = store_path or os.path.join(chunks_dir, STORE_NAMES[store_format()])
+    signature_path = store_path + '.json'
+    files = [f for f in list_chunk_files(chunks_dir) if os.path.exists(f)]
+    signature = _signature(files)
+
+    if use_store and os.path.exists(store_path) and os.path.exists(signature_path):
+        with open(signature_path, encoding='utf-8') as f:
+            if json.load(f) == signature:
+                logger.info(f"Loaded audit store {store_path} ({len(files)} chunks unchanged)")
+                return _read_store(store_path)
+
+    logger.info(f"Found {len(files)} chunk files:")
+    for f in files:
+        logger.info(f"  - {os.path.basename(f)}")
+    if max_workers == 1 or len(files) < 2:
+        results = [_try_read_chunk(f) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_try_read_chunk, files))
+    frames = []
+    for path, (frame, error) in zip(files, results):
+        if error is not None:
+            logger.warning(f"Failed to load {path}: {error}")
+            continue
+        frames.append(frame)
+    logger.info(f"Loaded {len(frames)} chunk DataFrames.")
+    if not frames:
+        return pd.DataFrame()
+    df = compact_audit_dtypes(pd.concat(frames, ignore_index=True))
+
+    if use_store:
+        _write_store(df, store_path)
+        with open(signature_path, 'w', encoding='utf-8') as f:
+            json.dump(signature, f)
+    return df
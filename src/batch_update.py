@@ -0,0 +1,159 @@
+# batch_update.py
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from updater import EmployeeCostMapper, build_fee_index
+from name_mappings import normalize_name, normalize_series, SKIP_NAMES
+from frame_cache import read_excel_cached
+from schema import AUDIT_LABELS, AuditLog, compact_dtypes, strip_labels
+from instrumentation import logger, span
+
+# Set once per worker process by _init_worker so the processed data is shipped once, not per target
+_shared = {}
+
+
+def _init_worker(processed_df, fee_index, skip_names, writer):
+    _shared.update(processed_df=processed_df, fee_index=fee_index, skip_names=skip_names, writer=writer)
+
+
+def _update_workbook(target_path, sheets):
+    """Update the given sheets of one workbook, one after another, into a single output.
+
+    Each sheet after the first is applied on top of the previous sheet's output so all
+    updates end up in the same '_updated' workbook. A failing sheet does not stop the rest.
+
+    :return: list of (target_path, sheet, audit DataFrame or None, error message or None)
+    """
+    results = []
+    base_path = None
+    for sheet in sheets:
+        try:
+            mapper = EmployeeCostMapper(target_path, None, sheet, _shared['skip_names'],
+                                        processed_df=_shared['processed_df'], writer=_shared['writer'],
+                                        base_path=base_path, fee_index=_shared['fee_index'])
+            mapper.map_employees()
+            mapper.update_costs()
+            base_path = mapper.output_path
+            audit = mapper.audit_frame()
+            audit.insert(0, 'Sheet', sheet)
+            audit.insert(0, 'Target', os.path.basename(target_path))
+            results.append((target_path, sheet, audit, None))
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            results.append((target_path, sheet, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def prepare_processed(processed_df=None, processed_path=None, use_cache=True):
+    """Load the processed timesheet once and add the normalized key columns and fee index.
+
+    :return: (processed_df, (fee_index, duplicates))
+    """
+    if processed_df is None:
+        processed_df = read_excel_cached(processed_path, use_cache=use_cache)
+    processed_df = compact_dtypes(processed_df)
+    processed_df['Name_norm'] = normalize_series(processed_df['Name'], normalize_name)
+    processed_df['Operation_norm'] = strip_labels(processed_df['Operation'])
+    return processed_df, build_fee_index(processed_df)
+
+
+def update_targets(targets, processed_df=None, processed_path=None, skip_names=SKIP_NAMES,
+                   max_workers=None, writer='patch', use_cache=True, history=None):
+    """Update many target workbooks/sheets from one processed dataset.
+
+    The processed data is loaded, normalized and indexed once and handed to a process
+    pool; workbooks are updated concurrently, the sheets of one workbook in order.
+
+    :param targets: iterable of (target_path, sheet_name)
+    :param max_workers: pool size (default: one per workbook, capped at the CPU count);
+        1 runs everything in this process
+    :param history: HistoryStore to record the merged audit log in (written from this
+        process only, after the workers finish)
+    :return: (merged audit DataFrame with Target/Sheet columns, dict (target_path, sheet) -> error)
+    """
+    by_workbook = {}
+    for target_path, sheet in targets:
+        sheets = by_workbook.setdefault(target_path, [])
+        if sheet not in sheets:
+            sheets.append(sheet)
+
+    with span('batch_update', targets=sum(len(s) for s in by_workbook.values())) as record:
+        processed_df, fee_index = prepare_processed(processed_df, processed_path, use_cache)
+        shared = (processed_df, fee_index, skip_names, writer)
+        workers = max_workers or min(len(by_workbook), os.cpu_count() or 1)
+        results = []
+        if workers <= 1 or len(by_workbook) < 2:
+            _init_worker(*shared)
+            for target_path, sheets in by_workbook.items():
+                results.extend(_update_workbook(target_path, sheets))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=shared) as pool:
+                futures = {pool.submit(_update_workbook, target_path, sheets): (target_path, sheets)
+                           for target_path, sheets in by_workbook.items()}
+                for future, (target_path, sheets) in futures.items():
+                    try:
+                        results.extend(future.result())
+                    except Exception as e:  # e.g. a worker process died
+                        results.extend((target_path, sheet, None, f"{type(e).__name__}: {e}") for sheet in sheets)
+
+        audits = [audit for _, _, audit, error in results if error is None]
+        errors = {(target_path, sheet): error for target_path, sheet, _, error in results if error is not None}
+        if audits:
+            # Categories differ between targets, so the concatenated labels are re-compacted
+            audit_df = compact_dtypes(pd.concat(audits, ignore_index=True),
+                                      labels=('Target', 'Sheet') + AUDIT_LABELS)
+        else:
+            audit_df = pd.DataFrame(columns=['Target', 'Sheet'] + AuditLog.COLUMNS)
+        record['rows'] = len(audit_df)
+        record['errors'] = len(errors)
+
+    if history is not None and len(audit_df):
+        with span('write', output=history.path) as record:
+            run_id = history.start_run('update', source=",".join(sorted(by_workbook)))
+            record['rows'] = history.add_audit(run_id, audit_df)
+        logger.info(f"Recorded merged audit log as run {run_id} in {history.path}")
+    logger.info(f"Updated {len(results) - len(errors)} of {len(results)} target sheets.")
+    for (target_path, sheet), error in errors.items():
+        logger.error(f"  - {target_path} [{sheet}]: {error}")
+    return audit_df, errors
+
+
+if __name__ == "__main__":
+    # Usage: python batch_update.py target1.xlsx[:Sheet] target2.xlsx[:Sheet] ...
+    #        [--processed=<path>] [--workers=N] [--audit=<path>] [--openpyxl-writer] [--no-cache]
+    #        [--history[=<db path>]]
+    import sys
+    from cli import flag, history_option
+    from instrumentation import configure, cli_options, profiled, write_report
+
+    options = cli_options(sys.argv)
+    configure(trace_memory=options['trace_memory'])
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    processed_path = flag(sys.argv, 'processed',
+                          os.path.abspath(os.path.join(BASE_DIR, "../docs/processed_timesheet.xlsx")))
+    workers = flag(sys.argv, 'workers')
+    max_workers = int(workers) if workers else None
+    audit_path = flag(sys.argv, 'audit')
+    targets = []
+    for arg in sys.argv[1:]:
+        if not arg.startswith('--'):
+            path, sep, sheet = arg.rpartition(':')
+            if not sep or not path.lower().endswith(('.xlsx', '.xlsm')):  # no sheet given (or a drive letter)
+                path, sheet = arg, ''
+            targets.append((os.path.abspath(path), sheet or "Project"))
+
+    history = history_option(sys.argv)
+
+    with profiled(options['profile'], options['profile_path']):
+        audit_df, errors = update_targets(targets, processed_path=processed_path, max_workers=max_workers,
+                                          writer='openpyxl' if '--openpyxl-writer' in sys.argv else 'patch',
+                                          use_cache='--no-cache' not in sys.argv, history=history)
+    if audit_path:
+        audit_df.to_excel(audit_path, index=False)
+        logger.info(f"Merged audit log saved to: {audit_path}")
+    if options['metrics_path']:
+        write_report(options['metrics_path'])
+    sys.exit(1 if errors else 0)
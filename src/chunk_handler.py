@@ -1,6 +1,35 @@
 # chunk_handler.py
+import os
+
+import numpy as np
 import pandas as pd
 
+from chunk_writer import ChunkWriter
+from name_mappings import normalize_series
+from schema import strip_labels
+from instrumentation import logger, span
+
+
+def partition_by(df, column, sort=False):
+    """Partition df by the values of column in a single pass.
+
+    Rows are stably reordered so each group is contiguous; groups appear in
+    first-seen order, or sorted when sort=True (like groupby). Rows whose key
+    is missing are dropped.
+
+    :return: (partitioned_df, spans) where spans is a list of (key, start, stop)
+        positions into partitioned_df; partitioned_df.iloc[start:stop] is a view
+    """
+    codes, uniques = pd.factorize(df[column], sort=sort)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    # Missing keys have code -1 and sort first; skip them
+    order = np.argsort(codes, kind='stable')[(codes < 0).sum():]
+    partitioned = df.take(order)
+    stops = np.cumsum(counts)
+    starts = stops - counts
+    return partitioned, list(zip(uniques, starts, stops))
+
+
 class ChunkHandler:
     def __init__(self, df, normalize_name_func, operation_col='Operation', name_col='Name', date_col='StartDate'):
         """
@@ -10,46 +39,65 @@ class ChunkHandler:
         :param name_col: column name for employee names
         :param date_col: column name for dates
         """
-        self.df = df.copy()
+        # Shallow copy: columns are added or replaced, never written in place
+        self.df = df.copy(deep=False)
         self.operation_col = operation_col
         self.name_col = name_col
         self.date_col = date_col
         self.normalize_name = normalize_name_func
         
         if self.name_col in self.df.columns:
-            self.df['Name_norm'] = self.df[self.name_col].apply(self.normalize_name)
+            self.df['Name_norm'] = normalize_series(self.df[self.name_col], self.normalize_name)
         else:
             self.df['Name_norm'] = None
     
     def add_normalized_columns(self):
         # Normalize operation, strip whitespace
         if self.operation_col in self.df.columns:
-            self.df['Operation_norm'] = self.df[self.operation_col].astype(str).str.strip()
+            operations = self.df[self.operation_col]
+            if not isinstance(operations.dtype, pd.CategoricalDtype):
+                operations = operations.astype(str)
+            self.df['Operation_norm'] = strip_labels(operations)
         else:
             self.df['Operation_norm'] = None
         
+        if 'Month' in self.df.columns and self.df['Month'].notna().all():
+            # Already derived by TimeSheetUpdater; keep its compact month codes
+            return
         if self.date_col in self.df.columns:
             self.df[self.date_col] = pd.to_datetime(self.df[self.date_col], errors='coerce')
             self.df['Month'] = self.df[self.date_col].dt.strftime('%Y-%m')
         else:
             self.df['Month'] = None
     
-    def get_chunks_by_operation(self):
-        """Yield tuples (operation, chunk_df) for each unique operation"""
+    def get_chunks_by_operation(self, copy=False):
+        """Yield tuples (operation, chunk_df) for each unique operation
+
+        Chunks are views into one partitioned frame; pass copy=True if the
+        consumer modifies them.
+        """
         self.add_normalized_columns()
-        unique_ops = self.df['Operation_norm'].dropna().unique()
-        for op in unique_ops:
-            chunk_df = self.df[self.df['Operation_norm'] == op].copy()
-            yield op, chunk_df
-
-    def save_chunks(self, out_dir, filename_prefix='chunk'):
-        import os
-        os.makedirs(out_dir, exist_ok=True)
-        for op, chunk in self.get_chunks_by_operation():
+        partitioned, spans = partition_by(self.df, 'Operation_norm')
+        for op, start, stop in spans:
+            chunk_df = partitioned.iloc[start:stop]
+            yield op, (chunk_df.copy() if copy else chunk_df)
+
+    def save_chunks(self, out_dir, filename_prefix='chunk', fmt='xlsx', max_workers=None, operations=None):
+        """Write one file per operation (in parallel) plus a manifest; see ChunkWriter.
+
+        :param operations: only write the chunks of these operations (incremental runs);
+            those without rows any more have their old chunk removed
+        """
+        with span('write', output=out_dir, format=fmt) as record:
             # Remove rows with any NaN values before saving
-            chunk_clean = chunk.dropna()
-            safe_op = op.replace(' ', '_').replace('/', '_')
-            filename = f"{filename_prefix}_{safe_op}.xlsx"
-            path = os.path.join(out_dir, filename)
-            chunk_clean.to_excel(path, index=False)
-            print(f"Saved chunk for operation '{op}' with {len(chunk_clean)} rows to {path}")
+            chunks = [(op, chunk.dropna()) for op, chunk in self.get_chunks_by_operation()
+                      if operations is None or op in operations]
+            vanished = {str(op).strip() for op in operations or ()} - {str(op) for op, _ in chunks}
+            records = ChunkWriter(out_dir, fmt, max_workers).write(
+                chunks, filename_prefix, merge_manifest=operations is not None, drop_operations=vanished)
+            record['rows'] = sum(r['rows'] for r in records)
+            record['chunks'] = len(records)
+        for record in records:
+            path = os.path.join(out_dir, record['file'])
+            logger.info(f"Saved chunk for operation '{record['operation']}' with {record['rows']} rows to {path}")
+        return records
@@ -0,0 +1,109 @@
+# chunk_writer.py
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from file_utils import atomic_path, file_sha256, write_json
+
+CHUNK_FORMATS = ('xlsx', 'csv', 'parquet', 'feather')
+# Cells (rows x columns) a write needs before a process pool pays for its start-up
+# (up to a second or two where workers are spawned); smaller writes stay in-process
+POOL_MIN_CELLS = {'xlsx': 100_000, 'csv': 5_000_000, 'parquet': 5_000_000, 'feather': 5_000_000}
+
+
+def safe_chunk_name(op):
+    """File-system safe version of an operation name."""
+    return op.replace(' ', '_').replace('/', '_')
+
+
+def write_chunk(df, path, fmt):
+    """Write one chunk atomically: to a hidden temp file in the same directory, then rename.
+
+    :return: manifest record for the written file
+    """
+    if fmt not in CHUNK_FORMATS:
+        raise ValueError(f"Unsupported chunk format '{fmt}', expected one of {CHUNK_FORMATS}")
+    with atomic_path(path) as tmp_path:
+        if fmt == 'xlsx':
+            df.to_excel(tmp_path, index=False)
+        elif fmt == 'csv':
+            df.to_csv(tmp_path, index=False)
+        elif fmt == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.reset_index(drop=True).to_feather(tmp_path)
+    return {'file': os.path.basename(path), 'rows': len(df), 'sha256': file_sha256(path)}
+
+
+class ChunkWriter:
+    def __init__(self, out_dir, fmt='xlsx', max_workers=None, manifest_name='manifest.json', pool_min_cells=None):
+        """
+        :param out_dir: directory the chunk files and manifest are written to
+        :param fmt: one of CHUNK_FORMATS
+        :param max_workers: size of the process pool; 1 writes serially in-process
+        :param manifest_name: file name of the JSON manifest, None to skip it
+        :param pool_min_cells: total cells below which chunks are written in-process
+            (default: POOL_MIN_CELLS for fmt)
+        """
+        if fmt not in CHUNK_FORMATS:
+            raise ValueError(f"Unsupported chunk format '{fmt}', expected one of {CHUNK_FORMATS}")
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.max_workers = max_workers
+        self.manifest_name = manifest_name
+        self.pool_min_cells = POOL_MIN_CELLS[fmt] if pool_min_cells is None else pool_min_cells
+
+    def _use_pool(self, jobs):
+        if self.max_workers == 1 or len(jobs) < 2 or (self.max_workers is None and (os.cpu_count() or 1) < 2):
+            return False
+        return sum(chunk.size for _, chunk, _ in jobs) >= self.pool_min_cells
+
+    def write(self, chunks, filename_prefix, merge_manifest=False, drop_operations=()):
+        """Write (operation, chunk_df) pairs as '<prefix>_<operation>.<fmt>' files.
+
+        :param merge_manifest: keep the existing manifest records of chunks not
+            written this time (used when only some chunks are rewritten)
+        :param drop_operations: operations that no longer exist; with merge_manifest
+            their chunk files are deleted and their records dropped
+        :return: list of manifest records, one per chunk, in input order
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        jobs = []
+        for op, chunk in chunks:
+            filename = f"{filename_prefix}_{safe_chunk_name(op)}.{self.fmt}"
+            jobs.append((op, chunk, os.path.join(self.out_dir, filename)))
+
+        if not self._use_pool(jobs):
+            results = [write_chunk(chunk, path, self.fmt) for _, chunk, path in jobs]
+        else:
+            workers = min(self.max_workers or os.cpu_count() or 1, len(jobs))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(write_chunk, chunk, path, self.fmt) for _, chunk, path in jobs]
+                results = [future.result() for future in futures]
+
+        records = []
+        for (op, _, _), result in zip(jobs, results):
+            records.append({'operation': op, **result})
+        if self.manifest_name:
+            self._write_manifest(records, merge_manifest, drop_operations)
+        return records
+
+    def _write_manifest(self, records, merge=False, drop_operations=()):
+        path = os.path.join(self.out_dir, self.manifest_name)
+        if merge and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                previous = json.load(f).get('chunks', [])
+            written = {record['file'] for record in records}
+            dropped = {str(op) for op in drop_operations}
+            kept = []
+            for record in previous:
+                if record['file'] in written:
+                    continue
+                if str(record.get('operation')) in dropped:
+                    stale_path = os.path.join(self.out_dir, record['file'])
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+                    continue
+                kept.append(record)
+            records = kept + records
+        write_json(path, {'format': self.fmt, 'chunks': records}, indent=2, ensure_ascii=False)
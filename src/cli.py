@@ -0,0 +1,133 @@
+# cli.py
+"""Single entry point for the pipeline stages.
+
+Usage: python cli.py <command> [flags]
+
+Commands:
+  process   source timesheet -> processed timesheet and chunks (flags as dataProcessor.py)
+  update    processed timesheet -> updated target sheet and audit chunks (flags as updater.py)
+  analyze   audit chunks -> operation summary and average spent per month
+            [--no-cache] [--insights | --fake-llm] [--history[=<db>] [--run=<id>] [--operation=<name>]]
+  plot      audit chunks -> average spent plot [--no-cache] [--output=<png>]
+  watch     keep the stages warm and re-run them when the source/target workbook changes
+            (flags as watcher.py)
+  forecast  audit chunks -> burn-rate metrics, forecast and per-operation plots
+            (flags as forecast.py)
+  diff      changed/added/removed cells between two target sheets, audit chunk sets or
+            recorded runs (flags as audit_diff.py)
+
+Each command imports only what it needs: 'process' and 'update' never load the
+plotting or LLM stack, and only 'plot' loads matplotlib/seaborn.
+"""
+import importlib
+import sys
+
+# Modules each command loads; used by load_command (and the startup benchmark)
+COMMAND_MODULES = {
+    'process': ('dataProcessor',),
+    'update': ('updater',),
+    'analyze': ('analyst',),
+    'plot': ('analyst', 'matplotlib.pyplot', 'seaborn'),
+    'watch': ('watcher',),
+    'forecast': ('forecast',),
+    'diff': ('audit_diff',),
+}
+
+
+def flag(argv, name, default=None):
+    """Value of the first --name=<value> in argv, or default."""
+    prefix = f'--{name}='
+    return next((arg[len(prefix):] for arg in argv if arg.startswith(prefix)), default)
+
+
+def history_option(argv):
+    """HistoryStore for --history[=<db path>], or None without the flag.
+
+    history_store (and with it SQLAlchemy) is only imported when the flag is given.
+    """
+    if not any(arg == '--history' or arg.startswith('--history=') for arg in argv):
+        return None
+    from history_store import history_from_argv
+    return history_from_argv(argv)
+
+
+def load_command(name):
+    """Import the modules a command needs without running it."""
+    for module in COMMAND_MODULES[name]:
+        importlib.import_module(module)
+
+
+def run_process(argv):
+    from dataProcessor import main
+    main(argv)
+
+
+def run_update(argv):
+    from updater import main
+    main(argv)
+
+
+def run_watch(argv):
+    from watcher import main
+    main(argv)
+
+
+def run_forecast(argv):
+    from forecast import main
+    return main(argv)
+
+
+def run_diff(argv):
+    from audit_diff import main
+    return main(argv)
+
+
+def run_analyze(argv):
+    from analyst import run_analysis
+    from instrumentation import configure
+
+    configure()
+    results = run_analysis(argv)
+    if results is None:
+        return 1
+    summary, avg_spent_per_month = results
+    print("\nOperation summary:")
+    print(summary.to_string(index=False))
+    print("\nAverage spent per operation and month:")
+    print(avg_spent_per_month.to_string(index=False))
+
+
+def run_plot(argv):
+    from analyst import run_analysis, plot_average_spent
+    from instrumentation import configure
+
+    configure()
+    results = run_analysis(argv)
+    if results is None:
+        return 1
+    plot_average_spent(results[1], flag(argv, 'output'))
+
+
+COMMANDS = {
+    'process': run_process,
+    'update': run_update,
+    'analyze': run_analyze,
+    'plot': run_plot,
+    'watch': run_watch,
+    'forecast': run_forecast,
+    'diff': run_diff,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(__doc__)
+        return 2
+    command, args = argv[0], argv[1:]
+    # The stage entry points parse flags from a full argv (program name first)
+    return COMMANDS[command]([f"cli.py {command}"] + args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
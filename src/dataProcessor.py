@@ -1,43 +1,57 @@
-import locale
 import pandas as pd
+import numpy as np
 import math
+import os
 from openpyxl import load_workbook
 
-from name_mappings import ALIAS_TO_CANONICAL
-from chunk_handler import ChunkHandler
+from name_mappings import normalize_name, normalize_series
+from chunk_handler import ChunkHandler, partition_by
+from frame_cache import read_excel_cached
+from run_state import RunState, fee_hashes, split_key
+from schema import compact_dtypes, strip_labels
+from work_packages import WorkPackageClassifier, load_classifier, log_unmapped_report
+from instrumentation import logger, span
+
+# Month abbreviations as produced by '%b' under de_DE.UTF-8, so Period labels
+# no longer depend on the host locale
+MONTH_ABBR = ['Jan', 'Feb', 'Mär', 'Apr', 'Mai', 'Jun', 'Jul', 'Aug', 'Sep', 'Okt', 'Nov', 'Dez']
+
+
+def period_label(year, month):
+    """'MMM-YY' label of a month (e.g. 'Okt-24')."""
+    return f"{MONTH_ABBR[month - 1]}-{year % 100:02d}"
 
-locale.setlocale(locale.LC_ALL, 'de_DE.UTF-8')
 
 class TimeSheetUpdater:
-    def __init__(self):
+    def __init__(self, work_packages_path=None):
+        """
+        :param work_packages_path: JSON work package -> operation config
+            (default: work_packages.DEFAULT_CONFIG_PATH)
+        """
         self.source_data = None
         self.target_data = None
-        
-        # Updated work package mappings
-        self.work_package_to_operation = {
-            # Avature Crew packages
-            '001 / Avature Crew  - PM/CM': 'Avature Crew',
-            '003 / Avature Crew  - Testcenter': 'Avature Crew',
-            '004 / Avature Crew  - Integrations': 'Avature Crew',
-            
-            # Avature Preboarding packages
-            '052 / Avature Crew - Pre-/Onboarding': 'Avature Preboarding',
-            
-            # Eightfold Crew packages
-            '007 / Eightfold Crew  - Testcenter': 'Eightfold Crew',
-            '005 / Eightfold Crew - PM/CM': 'Eightfold Crew',
-            '008 / Eightfold Crew  - Integrations': 'Eightfold Crew',
-            
-            # Avature ext. Careers Portal Crew packages
-            '053 / Ext.Careers Portal Crew - PM/CM': 'Avature ext. Careers Portal Crew',
-            '054 / Ext.Careers Portal Crew - Integration': 'Avature ext. Careers Portal Crew',
-            '056 / Ext.Careers Portal Crew - Testcenter': 'Avature ext. Careers Portal Crew'
-        }
-
-    def custom_round(self,value):
-        decimal_part = value - int(value)
-        result = math.ceil(value) if decimal_part >= 0.5 else math.floor(value)
-        return result
+        self.unmapped_packages = None
+
+        # Work package -> operation mapping, matched on normalized text or package code
+        self.classifier = load_classifier(work_packages_path)
+
+    @property
+    def work_package_to_operation(self):
+        return self.classifier.packages
+
+    @work_package_to_operation.setter
+    def work_package_to_operation(self, mapping):
+        self.classifier = WorkPackageClassifier(mapping)
+
+    def custom_round(self, value):
+        """Round a single fee; see custom_round_array."""
+        return int(self.custom_round_array([value])[0])
+
+    def custom_round_array(self, values):
+        """Round up from .5 on the truncated fraction, else floor."""
+        values = np.asarray(values, dtype='float64')
+        decimal_part = values - np.trunc(values)
+        return np.where(decimal_part >= 0.5, np.ceil(values), np.floor(values)).astype('int64')
     
     def format_period(self, date):
         """Convert date to 'MMM-YY' format (e.g., 'Oct-24')"""
@@ -45,144 +59,302 @@ class TimeSheetUpdater:
             if isinstance(date, str):
                 # Try to parse the date string
                 date = pd.to_datetime(date)
-            return date.strftime('%b-%y').title()
+            return period_label(date.year, date.month)
         except:
             return date
 
-    def load_and_process_data(self, source_path):
-        """Load and process source data into desired format"""
-        # Read source data
-        self.source_data = pd.read_excel(source_path)
-        
-        # Add operation column based on work package mapping
-        self.source_data['Operation'] = self.source_data['Work Package'].map(self.work_package_to_operation)
-        
-        null_count = self.source_data['Operation'].isna().sum()
-        print(f"Number of null operation rows:{null_count}")
-        
-        # Drop rows where Operation is None (unmapped work packages)
-        self.source_data = self.source_data.dropna(subset=['Operation'])
-        
-        # Convert Period to datetime if it isn't already
-        self.source_data['Period'] = pd.to_datetime(self.source_data['Period'])
-        
-        # Format Period to 'MMM-YY'
-        self.source_data['Period'] = self.source_data['Period'].apply(self.format_period)
-        
-        # Group by operation, name, and period
-        processed_data = self.source_data.groupby(
-            ['Operation', 'Name', 'Period']
-        ).agg({
-            'Fees': 'sum'
-        }).reset_index()
-        
-        processed_data['StartDate'] = (pd.to_datetime(
-            processed_data['Period'].apply(
-                lambda x: f"01-{x}"
-            ), 
-            format='%d-%b-%y'
-        ).apply(lambda x: x.strftime('%Y-%m')))
-
-        processed_data['Fees'] = processed_data['Fees'].apply(lambda x: self.custom_round(x))
-
-        # Sort the data
-        processed_data = processed_data.sort_values(
-            ['Operation', 'Name', 'StartDate'],
-            ascending=[False, True, True]
-        ).reset_index(drop=True)
+    def period_columns(self, months):
+        """Build the Period, StartDate and Month columns from a monthly Period series.
+
+        Only the distinct months are formatted; the labels are then broadcast back
+        through the factorized codes, so no per-row strftime/parse round-trip is needed.
+        """
+        codes, uniques = pd.factorize(months)
+        years = np.asarray(uniques.year)
+        month_nums = np.asarray(uniques.month)
+        labels = np.array([period_label(y, m) for y, m in zip(years, month_nums)], dtype=object)
+        month_keys = np.array([f"{y:04d}-{m:02d}" for y, m in zip(years, month_nums)], dtype=object)
+        start_dates = uniques.to_timestamp()
+        return pd.DataFrame({
+            'Period': labels[codes],
+            'StartDate': start_dates.take(codes),
+            'Month': month_keys[codes],
+        }, index=months.index)
+
+    def _aggregate_frame(self, source_path, use_cache=True):
+        """Read the whole source sheet and group fees by operation, name and period."""
+        # Read source data (served from the frame cache when the workbook is unchanged)
+        with span('read', source=source_path) as record:
+            self.source_data = read_excel_cached(source_path, use_cache=use_cache)
+            record['rows'] = len(self.source_data)
+
+        with span('map') as record:
+            # Add operation column based on work package mapping
+            work_packages = self.source_data['Work Package']
+            self.source_data['Operation'] = self.classifier.classify_series(work_packages)
+
+            null_count = self.source_data['Operation'].isna().sum()
+            logger.info(f"Number of null operation rows:{null_count}")
+            self.unmapped_packages = self.classifier.unmapped_report(work_packages, self.source_data['Fees'])
+            log_unmapped_report(self.unmapped_packages, self.classifier.config_path)
+
+            # Drop rows where Operation is None (unmapped work packages)
+            self.source_data = self.source_data.dropna(subset=['Operation'])
+            record['rows'] = len(self.source_data)
+            record['unmapped_rows'] = int(null_count)
+
+        with span('aggregate') as record:
+            # Convert Period to a monthly period; labels are formatted after grouping
+            self.source_data['Period'] = pd.to_datetime(self.source_data['Period']).dt.to_period('M')
+
+            # Group by operation, name, and period
+            processed_data = self.source_data.groupby(
+                ['Operation', 'Name', 'Period']
+            ).agg({
+                'Fees': 'sum'
+            }).reset_index()
+            record['rows'] = len(processed_data)
+        return processed_data
+
+    def stream_aggregate(self, source_path):
+        """Aggregate fees per (Operation, Name, Period) while streaming the source sheet.
+
+        Rows are read with openpyxl's read-only iterator, unmapped work packages are
+        dropped as they arrive and only the running group totals are kept, so memory
+        depends on the number of groups rather than the number of input rows. The
+        result matches the groupby in load_and_process_data.
+        """
+        wb = load_workbook(source_path, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            rows = ws.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else h for h in next(rows, ())]
+            wp_idx = header.index('Work Package')
+            name_idx = header.index('Name')
+            period_idx = header.index('Period')
+            fees_idx = header.index('Fees')
+
+            totals = {}  # (Operation, Name, Period) -> [sum, compensation]
+            periods = {}  # raw Period value -> monthly pd.Period
+            null_count = 0
+            unmapped = {}  # work package -> [rows, fees]
+            classify = self.classifier.classify
+            for values in rows:
+                operation = classify(values[wp_idx])
+                if operation is None:
+                    null_count += 1
+                    acc = unmapped.setdefault(values[wp_idx], [0, 0.0])
+                    acc[0] += 1
+                    fee = values[fees_idx]
+                    if fee is not None and not (isinstance(fee, float) and math.isnan(fee)):
+                        acc[1] += fee
+                    continue
+                name = values[name_idx]
+                raw_period = values[period_idx]
+                if name is None or raw_period is None:
+                    continue
+                if raw_period not in periods:
+                    periods[raw_period] = pd.Period(pd.to_datetime(raw_period), freq='M')
+                key = (operation, name, periods[raw_period])
+                acc = totals.setdefault(key, [0, 0.0])
+                fee = values[fees_idx]
+                if fee is None or (isinstance(fee, float) and math.isnan(fee)):
+                    continue
+                # Kahan summation, as used by pandas' groupby sum
+                y = fee - acc[1]
+                t = acc[0] + y
+                acc[1] = (t - acc[0]) - y
+                acc[0] = t
+        finally:
+            wb.close()
+
+        logger.info(f"Number of null operation rows:{null_count}")
+        self.unmapped_packages = pd.DataFrame(
+            [(package, rows, fees) for package, (rows, fees) in unmapped.items()],
+            columns=['Work Package', 'Rows', 'Fees'],
+        ).sort_values('Fees', ascending=False, ignore_index=True)
+        log_unmapped_report(self.unmapped_packages, self.classifier.config_path)
+        keys = sorted(totals)
+        return pd.DataFrame({
+            'Operation': [k[0] for k in keys],
+            'Name': [k[1] for k in keys],
+            'Period': pd.PeriodIndex([k[2] for k in keys], freq='M'),
+            'Fees': [totals[k][0] for k in keys],
+        })
+
+    def load_and_process_data(self, source_path, use_cache=True, streaming=False, chunk_format='xlsx',
+                              incremental=False, state=None, save_chunks=True, history=None):
+        """Load and process source data into desired format
+
+        :param streaming: aggregate while streaming the workbook (see stream_aggregate)
+            instead of loading the whole sheet with pd.read_excel
+        :param chunk_format: file format of the processed chunks (see chunk_writer.CHUNK_FORMATS)
+        :param incremental: only rewrite the chunks of operations whose
+            (Operation, Name, Month) fees changed since the previous run
+        :param state: RunState holding the previous run's fee hashes (default location if None)
+        :param save_chunks: write the per-operation processed chunks to ../chunks/processed_chunks
+        :param history: HistoryStore to record the processed fees in, tagged with a new run id
+        """
+        if streaming:
+            # Reading, mapping and aggregating happen in one streamed pass
+            with span('read', source=source_path, mode='streaming') as record:
+                processed_data = self.stream_aggregate(source_path)
+                record['rows'] = len(processed_data)
+        else:
+            processed_data = self._aggregate_frame(source_path, use_cache)
+
+        with span('aggregate', step='format') as record:
+            # Period label ('MMM-YY'), StartDate (first of month) and Month ('YYYY-MM') in one pass
+            periods = self.period_columns(processed_data['Period'])
+            processed_data['Period'] = periods['Period']
+            processed_data['StartDate'] = periods['StartDate']
+            processed_data['Month'] = periods['Month']
+
+            processed_data['Fees'] = self.custom_round_array(processed_data['Fees'])
+
+            # Sort the data
+            processed_data = processed_data.sort_values(
+                ['Operation', 'Name', 'StartDate'],
+                ascending=[False, True, True]
+            ).reset_index(drop=True)
+            # Categorical labels, month-ordinal Month codes and int32 fees
+            processed_data = compact_dtypes(processed_data)
+            record['rows'] = len(processed_data)
         
         # Save processed dataframe for chunking
         self.processed_df = processed_data
         
-        handler = ChunkHandler(self.processed_df, self.normalize_name)
-        handler.save_chunks("../chunks/processed_chunks", filename_prefix="processed")
-        return self.processed_df
+        changed_operations = None
+        if incremental:
+            state = state or RunState()
+            hashes = fee_hashes(
+                zip(processed_data['Operation'], processed_data['Name'], processed_data['Month']),
+                processed_data['Fees'],
+            )
+            changed, removed = state.diff('processed', hashes)
+            changed_operations = {split_key(key)[0] for key in changed | removed}
+            logger.info(f"Incremental run: {len(changed)} new or changed and {len(removed)} removed keys "
+                  f"in {len(changed_operations)} operations")
 
-    def get_operation_chunks(self):
-        """Yield dataframes grouped by each unique Operation."""
-        if not hasattr(self, 'processed_df'):
-            raise AttributeError("processed_df not found. Please run load_and_process_data first.")
-            
-        for operation, chunk_df in self.processed_df.groupby('Operation'):
-            yield operation, chunk_df.copy()
+        if save_chunks and (changed_operations is None or changed_operations):
+            handler = ChunkHandler(self.processed_df, self.normalize_name)
+            handler.save_chunks("../chunks/processed_chunks", filename_prefix="processed", fmt=chunk_format,
+                                operations=changed_operations)
+        if incremental and save_chunks:
+            state.update('processed', hashes)
+            state.save()
+        if history is not None:
+            with span('write', output=history.path) as record:
+                self.history_run_id = history.start_run('process', source=os.path.abspath(source_path))
+                record['rows'] = history.add_processed(self.history_run_id, self.processed_df)
+            logger.info(f"Recorded processed fees as run {self.history_run_id} in {history.path}")
+        return self.processed_df
 
     def process_operation_chunk(self, operation, chunk_df):
-        """Process a chunk of data for a given operation.
+        """Process a chunk of data for a given operation (None: all operations at once).
 
-        Apply normalization, filtering, chunk-level processing here.
+        Apply normalization, filtering, chunk-level processing here. The steps must
+        be column-wise, since process_all_chunks runs them once on the whole frame.
         """
         # Normalize names in this chunk
-        chunk_df['Name_norm'] = chunk_df['Name'].apply(self.normalize_name)
-        chunk_df['Operation_norm'] = chunk_df['Operation'].str.strip()
-        chunk_df['StartDate'] = pd.to_datetime(chunk_df['StartDate'], errors='coerce')
-        chunk_df['Month'] = chunk_df['StartDate'].dt.strftime('%Y-%m')
+        chunk_df['Name_norm'] = normalize_series(chunk_df['Name'], self.normalize_name)
+        chunk_df['Operation_norm'] = strip_labels(chunk_df['Operation'])
+        # StartDate/Month come from load_and_process_data; derive them only for chunks that lack them
+        if 'Month' not in chunk_df.columns:
+            chunk_df['StartDate'] = pd.to_datetime(chunk_df['StartDate'], errors='coerce')
+            chunk_df['Month'] = chunk_df['StartDate'].dt.strftime('%Y-%m')
 
         return chunk_df
 
     def process_all_chunks(self):
         """Process all operation chunks and return concatenated DataFrame."""
-        all_processed_chunks = []
-        for operation, chunk_df in self.get_operation_chunks():
-            print(f"Processing chunk: {operation} with {len(chunk_df)} rows")
-            processed_chunk = self.process_operation_chunk(operation, chunk_df)
-            all_processed_chunks.append(processed_chunk)
-        self.processed_df = pd.concat(all_processed_chunks, ignore_index=True)
-        print(f"All chunks processed. Total rows: {len(self.processed_df)}")
+        if not hasattr(self, 'processed_df'):
+            raise AttributeError("processed_df not found. Please run load_and_process_data first.")
+
+        # The partitioned frame is a private copy laid out chunk by chunk, and the
+        # chunk-level steps are column-wise, so process it once instead of copying
+        # and concatenating every chunk
+        with span('chunk') as record:
+            partitioned, spans = partition_by(self.processed_df, 'Operation', sort=True)
+            logger.info(f"Processing {len(spans)} operation chunks with {len(partitioned)} rows")
+            processed = self.process_operation_chunk(None, partitioned)
+            self.processed_df = processed.reset_index(drop=True)
+            record['rows'] = len(self.processed_df)
+            record['chunks'] = len(spans)
+        logger.info(f"All chunks processed. Total rows: {len(self.processed_df)}")
         return self.processed_df
 
     def normalize_name(self, name):
-        if not name:
-            return None
-        return ALIAS_TO_CANONICAL.get(name.strip().lower(), name.strip())
+        return normalize_name(name)
 
     def save_processed_data(self, data, output_path):
         """Save the processed data to Excel"""
-        # Save to Excel with specific formatting
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            data.to_excel(
-                writer,
-                index=False,
-                sheet_name='Processed Data'
-            )
+        with span('write', output=output_path) as record:
+            # Save to Excel with specific formatting
+            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                data.to_excel(
+                    writer,
+                    index=False,
+                    sheet_name='Processed Data'
+                )
             
-            # Get the workbook and worksheet
-            workbook = writer.book
-            worksheet = writer.sheets['Processed Data']
+                # Get the workbook and worksheet
+                workbook = writer.book
+                worksheet = writer.sheets['Processed Data']
             
-            # Adjust column widths
-            worksheet.column_dimensions['A'].width = 40  # Operation
-            worksheet.column_dimensions['B'].width = 35  # Name
-            worksheet.column_dimensions['C'].width = 12  # Period
-            worksheet.column_dimensions['D'].width = 12  # Fees
-            
-        print(f"\nProcessed data saved to: {output_path}")
-        print("\nFirst few rows of processed data:")
-        print(data.head())
+                # Adjust column widths
+                worksheet.column_dimensions['A'].width = 40  # Operation
+                worksheet.column_dimensions['B'].width = 35  # Name
+                worksheet.column_dimensions['C'].width = 12  # Period
+                worksheet.column_dimensions['D'].width = 12  # Fees
+            record['rows'] = len(data)
+
+        logger.info(f"\nProcessed data saved to: {output_path}")
+        logger.info("\nFirst few rows of processed data:")
+        logger.info(data.head().to_string())
         
-        print("\nUnique periods in the data:")
-        print(sorted(data['Period'].unique()))
+        logger.info("\nUnique periods in the data:")
+        logger.info(str(sorted(data['Period'].unique())))
 
-def main():
-    updater = TimeSheetUpdater()
+def main(argv=None):
+    import sys
+    from cli import flag, history_option
+    from instrumentation import configure, cli_options, profiled, write_report
+
+    argv = sys.argv if argv is None else argv
+    options = cli_options(argv)
+    configure(trace_memory=options['trace_memory'])
+    use_cache = '--no-cache' not in argv
+    streaming = '--streaming' in argv
+    chunk_format = flag(argv, 'chunk-format', 'xlsx')
+    incremental = '--incremental' in argv
+    work_packages_path = flag(argv, 'work-packages')
+    history = history_option(argv)
+    updater = TimeSheetUpdater(work_packages_path)
     
     try:
-        print("Loading and processing data...")
-        updater.load_and_process_data('../docs/source_timesheet.xlsx')
-        
-        # Process chunks now
-        print("Processing data in chunks...")
-        processed_df = updater.process_all_chunks()
-        
-        # Save processed data after chunk processing
-        print("\nSaving processed data...")
-        updater.save_processed_data(processed_df, '../docs/processed_timesheet.xlsx')
+        with profiled(options['profile'], options['profile_path']):
+            logger.info("Loading and processing data...")
+            updater.load_and_process_data('../docs/source_timesheet.xlsx', use_cache=use_cache, streaming=streaming,
+                                          chunk_format=chunk_format, incremental=incremental, history=history)
+
+            # Process chunks now
+            logger.info("Processing data in chunks...")
+            processed_df = updater.process_all_chunks()
+
+            # Save processed data after chunk processing
+            logger.info("\nSaving processed data...")
+            updater.save_processed_data(processed_df, '../docs/processed_timesheet.xlsx')
         
-        print("\nProcess completed successfully!")
+        logger.info("\nProcess completed successfully!")
         
     except Exception as e:
-        print(f"\nError: {str(e)}")
+        logger.error(f"\nError: {str(e)}")
         import traceback
-        print(traceback.format_exc())
+        logger.error(traceback.format_exc())
+    finally:
+        if options['metrics_path']:
+            write_report(options['metrics_path'])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
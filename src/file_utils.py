@@ -0,0 +1,85 @@
+# file_utils.py
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temp path next to path that replaces path when the block succeeds.
+
+    The temp name is unique per call, so processes writing the same target never
+    share a temp file; the last rename wins. It starts with a dot (kept out of
+    '*.xlsx' style globs and cache listings) and keeps the extension last so
+    pandas and zipfile writers see the right file type. On error the temp file
+    is removed and path is left untouched.
+    """
+    out_dir, filename = os.path.split(os.path.abspath(path))
+    tmp_path = os.path.join(out_dir, f".{uuid.uuid4().hex}.{filename}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json(path, data, **dump_kwargs):
+    """json.dump data to path atomically (UTF-8)."""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+
+
+def file_sha256(path):
+    """Hex SHA-256 of the file's contents, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def touch(path):
+    """Mark a cache entry as recently used for evict_lru; a vanished entry is ignored."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict_lru(cache_dir, suffix, max_bytes=None, max_entries=None, keep=None):
+    """Remove the least recently used (oldest mtime) '*<suffix>' entries of cache_dir.
+
+    Entries are removed until both limits hold. Temp files of writes in progress
+    are never counted or removed.
+
+    :param max_bytes: cap on the total size of the entries, None for no cap
+    :param max_entries: cap on the number of entries, None for no cap
+    :param keep: path that is never evicted (the entry just written)
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith(".") or not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    count = len(entries)
+    for _, size, path in sorted(entries):
+        if (max_bytes is None or total <= max_bytes) and (max_entries is None or count <= max_entries):
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # evicted by another process
+        total -= size
+        count -= 1
@@ -0,0 +1,259 @@
+# forecast.py
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunk_writer import safe_chunk_name, write_chunk
+from instrumentation import logger, span
+
+DEFAULT_OUTPUT_DIR = "../reports/forecast"
+
+
+def _month_ordinal(label):
+    year, month = str(label)[:7].split('-')
+    return int(year) * 12 + int(month) - 1
+
+
+def _month_label(ordinal):
+    return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+
+
+def cost_matrix(audit_df, value='Fees_after'):
+    """Pivot the audit data into a dense Operation x Month matrix of real fee totals.
+
+    -1 sentinels are ignored. Months run continuously from the first to the last
+    month with data, so gaps show up as NaN rather than being skipped.
+
+    :return: (matrix, operations, months) with matrix[i, j] the spend of
+        operations[i] in months[j] ('YYYY-MM'), NaN where no cell had a fee
+    """
+    fees = pd.to_numeric(audit_df[value], errors='coerce').to_numpy(dtype='float64')
+    op_codes, operations = pd.factorize(audit_df['Operation'].astype(str), sort=True)
+    month_codes, month_uniques = pd.factorize(audit_df['Month'].astype(str))
+    ordinals = np.array([_month_ordinal(m) for m in month_uniques], dtype=np.int64)[month_codes]
+    valid = (fees != -1) & ~np.isnan(fees) & (op_codes >= 0) & (month_codes >= 0)
+    if not valid.any():
+        return np.empty((len(operations), 0)), list(operations), []
+
+    first, last = ordinals[valid].min(), ordinals[valid].max()
+    n_ops, n_months = len(operations), int(last - first + 1)
+    flat = op_codes[valid] * n_months + (ordinals[valid] - first)
+    totals = np.bincount(flat, weights=fees[valid], minlength=n_ops * n_months).reshape(n_ops, n_months)
+    counts = np.bincount(flat, minlength=n_ops * n_months).reshape(n_ops, n_months)
+    matrix = np.where(counts > 0, totals, np.nan)
+    return matrix, list(operations), [_month_label(o) for o in range(first, last + 1)]
+
+
+def rolling_mean(matrix, window=3):
+    """Trailing mean over the last window months of every row, ignoring NaN months."""
+    values = np.nan_to_num(matrix)
+    present = (~np.isnan(matrix)).astype('float64')
+    # Window sums as differences of running sums, shifted by window months
+    sums = np.cumsum(values, axis=1)
+    counts = np.cumsum(present, axis=1)
+    sums[:, window:] -= np.cumsum(values, axis=1)[:, :-window]
+    counts[:, window:] -= np.cumsum(present, axis=1)[:, :-window]
+    return np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+
+
+def cumulative_burn(matrix):
+    """Running total spend per operation (months without data add nothing)."""
+    return np.cumsum(np.nan_to_num(matrix), axis=1)
+
+
+def month_over_month(matrix):
+    """(delta, pct_change) against the previous month; the first month is NaN."""
+    delta = np.full_like(matrix, np.nan)
+    delta[:, 1:] = matrix[:, 1:] - matrix[:, :-1]
+    pct = np.full_like(matrix, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pct[:, 1:] = delta[:, 1:] / matrix[:, :-1]
+    pct[~np.isfinite(pct)] = np.nan
+    return delta, pct
+
+
+def linear_seasonal_forecast(matrix, first_month, horizon=6, season_length=12):
+    """Forecast horizon months for every operation at once.
+
+    A least-squares line is fitted per row over its non-NaN months. When a row has at
+    least two full seasons of data, the mean residual per calendar position in the
+    season is added on top. Forecasts are clipped at zero.
+
+    :param first_month: 'YYYY-MM' of the matrix's first column (aligns the seasons)
+    :return: (forecast matrix of shape (operations, horizon), slope per operation)
+    """
+    n_ops, n_months = matrix.shape
+    present = ~np.isnan(matrix)
+    weights = present.astype('float64')
+    values = np.nan_to_num(matrix)
+    t = np.arange(n_months, dtype='float64')
+
+    n_points = weights.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = (weights * t).sum(axis=1) / n_points
+        y_mean = (weights * values).sum(axis=1) / n_points
+        t_dev = (t[None, :] - t_mean[:, None]) * weights
+        denom = (t_dev ** 2).sum(axis=1)
+        slope = np.where(denom > 0, (t_dev * (values - y_mean[:, None])).sum(axis=1) / denom, 0.0)
+    intercept = y_mean - slope * t_mean
+
+    future_t = np.arange(n_months, n_months + horizon, dtype='float64')
+    forecast = intercept[:, None] + slope[:, None] * future_t[None, :]
+
+    start = _month_ordinal(first_month)
+    season_of = (start + np.arange(n_months + horizon)) % season_length
+    residuals = np.where(present, values - (intercept[:, None] + slope[:, None] * t[None, :]), 0.0)
+    one_hot = (season_of[:n_months, None] == np.arange(season_length)[None, :]).astype('float64')
+    season_sums = residuals @ one_hot
+    season_counts = weights @ one_hot
+    with np.errstate(invalid='ignore', divide='ignore'):
+        seasonal = np.where(season_counts > 0, season_sums / season_counts, 0.0)
+    has_seasons = (n_points >= 2 * season_length)[:, None]
+    forecast = forecast + np.where(has_seasons, seasonal[:, season_of[n_months:]], 0.0)
+
+    forecast[n_points == 0] = np.nan
+    return np.clip(forecast, 0, None), slope
+
+
+def burn_rate_analysis(audit_df, window=3, horizon=6, season_length=12):
+    """Monthly metrics, forecast and per-operation summary as long DataFrames.
+
+    :return: dict with the frames 'monthly' (Operation, Month, Spent, RollingMean,
+        CumulativeBurn, MoMDelta, MoMPct), 'forecast' (Operation, Month, Forecast) and
+        'summary', plus the underlying matrices for render_plots
+    """
+    with span('forecast', window=window, horizon=horizon) as record:
+        matrix, operations, months = cost_matrix(audit_df)
+        n_ops, n_months = matrix.shape
+        rolling = rolling_mean(matrix, window)
+        burn = cumulative_burn(matrix)
+        delta, pct = month_over_month(matrix)
+        if n_months:
+            predicted, slope = linear_seasonal_forecast(matrix, months[0], horizon, season_length)
+            last = _month_ordinal(months[-1])
+            future_months = [_month_label(last + k) for k in range(1, horizon + 1)]
+        else:
+            predicted, slope, future_months = np.empty((n_ops, 0)), np.zeros(n_ops), []
+
+        op_index = np.repeat(np.array(operations, dtype=object), n_months)
+        monthly = pd.DataFrame({
+            'Operation': op_index,
+            'Month': np.tile(np.array(months, dtype=object), n_ops),
+            'Spent': matrix.ravel(),
+            'RollingMean': rolling.ravel(),
+            'CumulativeBurn': burn.ravel(),
+            'MoMDelta': delta.ravel(),
+            'MoMPct': pct.ravel(),
+        })
+        forecast = pd.DataFrame({
+            'Operation': np.repeat(np.array(operations, dtype=object), len(future_months)),
+            'Month': np.tile(np.array(future_months, dtype=object), n_ops),
+            'Forecast': predicted.ravel(),
+        })
+        months_with_data = (~np.isnan(matrix)).sum(axis=1)
+        total = burn[:, -1] if n_months else np.zeros(n_ops)
+        summary = pd.DataFrame({
+            'Operation': operations,
+            'MonthsWithData': months_with_data,
+            'TotalBurn': total,
+            'AverageMonthly': np.divide(total, months_with_data, out=np.full(n_ops, np.nan),
+                                        where=months_with_data > 0),
+            'TrendPerMonth': slope,
+            'ForecastTotal': np.nansum(predicted, axis=1) if len(future_months) else np.zeros(n_ops),
+        })
+        record['rows'] = n_ops
+        record['months'] = n_months
+    # The frames are written to files; the arrays feed render_plots
+    return {'monthly': monthly, 'forecast': forecast, 'summary': summary,
+            'matrix': matrix, 'operations': operations, 'months': months, 'rolling': rolling,
+            'predicted': predicted, 'future_months': future_months}
+
+
+def write_results(results, output_dir=DEFAULT_OUTPUT_DIR, fmt='csv'):
+    """Write the monthly, forecast and summary frames as <name>.<fmt> (see chunk_writer.write_chunk)."""
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for name in ('monthly', 'forecast', 'summary'):
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        write_chunk(results[name], path, fmt)
+        written.append(path)
+        logger.info(f"Saved {name} results to: {path}")
+    return written
+
+
+def render_plots(results, output_dir=DEFAULT_OUTPUT_DIR):
+    """Render one PNG per operation (spend, rolling mean and forecast) with the Agg backend.
+
+    A single figure is reused for every operation, so hundreds of plots render
+    without a display and without per-plot figure setup.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    matrix, rolling, predicted = results['matrix'], results['rolling'], results['predicted']
+    operations, months, future_months = results['operations'], results['months'], results['future_months']
+    plot_dir = os.path.join(output_dir, "plots")
+    os.makedirs(plot_dir, exist_ok=True)
+    x_hist = np.arange(len(months))
+    x_future = np.arange(len(months), len(months) + len(future_months))
+    labels = months + future_months
+    step = max(1, len(labels) // 12)
+
+    written = []
+    with span('write', output=plot_dir, format='png') as record:
+        fig, ax = plt.subplots(figsize=(10, 5))
+        for i, operation in enumerate(operations):
+            ax.clear()
+            ax.plot(x_hist, matrix[i], marker='o', label='Spent')
+            ax.plot(x_hist, rolling[i], label='Rolling mean')
+            if len(future_months):
+                ax.plot(x_future, predicted[i], linestyle='--', marker='x', label='Forecast')
+            ax.set_title(f"{operation}: monthly spend")
+            ax.set_ylabel("Fees (€)")
+            ax.set_xticks(np.arange(len(labels))[::step])
+            ax.set_xticklabels(labels[::step], rotation=45)
+            ax.legend(loc='upper left')
+            fig.tight_layout()
+            path = os.path.join(plot_dir, f"{safe_chunk_name(operation)}.png")
+            fig.savefig(path)
+            written.append(path)
+        plt.close(fig)
+        record['rows'] = len(written)
+    logger.info(f"Saved {len(written)} plots to: {plot_dir}")
+    return written
+
+
+def main(argv=None):
+    # Usage: python forecast.py [--window=3] [--horizon=6] [--season=12] [--output-dir=<dir>]
+    #        [--format=csv] [--no-plots] [--no-cache] [--history[=<db>] [--run=<id>]]
+    import sys
+    from cli import flag, history_option
+    from instrumentation import configure
+
+    argv = sys.argv if argv is None else argv
+    configure()
+
+    store = history_option(argv)
+    if store is not None:
+        run = flag(argv, 'run')
+        audit_df = store.audit_frame(int(run) if run else None)
+    else:
+        from audit_loader import load_audit_chunks
+        from analyst import CHUNKS_DIR
+        audit_df = load_audit_chunks(CHUNKS_DIR, use_store='--no-cache' not in argv)
+    if audit_df.empty:
+        logger.info("No audit data loaded. Exiting.")
+        return 1
+
+    output_dir = flag(argv, 'output-dir', DEFAULT_OUTPUT_DIR)
+    results = burn_rate_analysis(audit_df, window=int(flag(argv, 'window', 3)), horizon=int(flag(argv, 'horizon', 6)),
+                                 season_length=int(flag(argv, 'season', 12)))
+    write_results(results, output_dir, fmt=flag(argv, 'format', 'csv'))
+    if '--no-plots' not in argv:
+        render_plots(results, output_dir)
+
+
+if __name__ == "__main__":
+    main()
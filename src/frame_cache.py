@@ -0,0 +1,85 @@
+# frame_cache.py
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from file_utils import atomic_path, evict_lru, file_sha256, touch, write_json
+
+DEFAULT_CACHE_DIR = "../cache/frames"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+
+
+class FrameCache:
+    """Cache parsed Excel sheets as pickled DataFrames.
+
+    Entries are keyed by a SHA-256 of the workbook contents plus the read
+    arguments. The content hash is only recomputed when the file's mtime or
+    size changes, so a hit costs one os.stat and one unpickle.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        """
+        :param cache_dir: directory holding the cached frames and the index file
+        :param max_bytes: total size cap; least recently used entries are evicted past it
+        :param enabled: when False every read goes straight to pd.read_excel
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        write_json(self.index_path, index, indent=2)
+
+    def _content_hash(self, path, index):
+        """Return the file's content hash, reusing the indexed one if mtime/size match.
+
+        A new or changed file gets its record in index updated in place.
+        """
+        stat = os.stat(path)
+        abs_path = os.path.abspath(path)
+        record = index.get(abs_path)
+        if record and record["mtime_ns"] == stat.st_mtime_ns and record["size"] == stat.st_size:
+            return record["sha256"]
+        index[abs_path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": file_sha256(path)}
+        return index[abs_path]["sha256"]
+
+    def _entry_path(self, content_hash, read_kwargs):
+        kwargs_key = json.dumps(read_kwargs, sort_keys=True, default=str)
+        key = hashlib.sha256(f"{content_hash}:{kwargs_key}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def read_excel(self, path, **read_kwargs):
+        """Drop-in for pd.read_excel that serves repeated reads from the cache."""
+        if not self.enabled:
+            return pd.read_excel(path, **read_kwargs)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = self._load_index()
+        abs_path = os.path.abspath(path)
+        previous = index.get(abs_path)
+        entry_path = self._entry_path(self._content_hash(path, index), read_kwargs)
+        if index.get(abs_path) != previous:
+            self._save_index(index)
+        if os.path.exists(entry_path):
+            touch(entry_path)
+            return pd.read_pickle(entry_path)
+
+        df = pd.read_excel(path, **read_kwargs)
+        with atomic_path(entry_path) as tmp_path:
+            df.to_pickle(tmp_path)
+        evict_lru(self.cache_dir, ".pkl", max_bytes=self.max_bytes, keep=entry_path)
+        return df
+
+
+def read_excel_cached(path, use_cache=True, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, **read_kwargs):
+    """Read an Excel sheet through a FrameCache; use_cache=False bypasses it."""
+    return FrameCache(cache_dir, max_bytes, enabled=use_cache).read_excel(path, **read_kwargs)
@@ -0,0 +1,261 @@
+# history_store.py
+import datetime
+import os
+
+import pandas as pd
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table,
+    case, create_engine, distinct, event, func, insert, select,
+)
+
+from name_mappings import normalize_name, normalize_series
+
+DEFAULT_DB_PATH = "../state/history.sqlite"
+
+metadata = MetaData()
+
+runs = Table(
+    "runs", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("stage", String, nullable=False),
+    Column("source", String),
+    Column("started_at", DateTime, nullable=False),
+    Column("rows", Integer),
+)
+
+processed_fees = Table(
+    "processed_fees", metadata,
+    Column("run_id", Integer, ForeignKey("runs.id"), nullable=False),
+    Column("operation", String, nullable=False),
+    Column("employee", String),
+    Column("name", String),
+    Column("month", String, nullable=False),
+    Column("fees", Float),
+    Index("ix_processed_fees_key", "operation", "employee", "month"),
+    Index("ix_processed_fees_run", "run_id"),
+)
+
+cell_audit = Table(
+    "cell_audit", metadata,
+    Column("run_id", Integer, ForeignKey("runs.id"), nullable=False),
+    Column("target", String),
+    Column("sheet", String),
+    Column("operation", String, nullable=False),
+    Column("employee", String, nullable=False),
+    Column("month", String, nullable=False),
+    Column("cell", String),
+    Column("fees_before", Float),
+    Column("fees_after", Float),
+    Index("ix_cell_audit_key", "operation", "employee", "month"),
+    Index("ix_cell_audit_run", "run_id"),
+)
+
+
+def _values(series):
+    """Column values as Python scalars, with missing values as None."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _match(column, value):
+    """WHERE clause for one filter: a single value or a list of values."""
+    if isinstance(value, (list, tuple, set)):
+        return column.in_(list(value))
+    return column == value
+
+
+class HistoryStore:
+    """Processed fees and cell audit logs of every run in one indexed SQLite file.
+
+    Each stage run gets a row in 'runs'; its outputs are bulk-inserted tagged with
+    that run id, so fee histories across runs are answered with indexed queries
+    instead of re-reading old workbooks.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, echo=False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.engine = create_engine(f"sqlite:///{os.path.abspath(path)}", echo=echo)
+        event.listen(self.engine, "connect", self._set_pragmas)
+        metadata.create_all(self.engine)
+
+    @staticmethod
+    def _set_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets analyst queries read while a run is writing
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    def start_run(self, stage, source=None):
+        """Register a run of stage ('process', 'update', ...) and return its id."""
+        with self.engine.begin() as conn:
+            result = conn.execute(insert(runs).values(
+                stage=stage, source=source, started_at=datetime.datetime.now()))
+            return result.inserted_primary_key[0]
+
+    def _finish_run(self, conn, run_id, rows):
+        conn.execute(runs.update().where(runs.c.id == run_id).values(rows=rows))
+
+    def add_processed(self, run_id, processed_df):
+        """Bulk-insert a processed timesheet (Operation, Name[, Name_norm], Month, Fees)."""
+        if 'Name_norm' in processed_df.columns:
+            employees = processed_df['Name_norm']
+        else:
+            employees = normalize_series(processed_df['Name'], normalize_name)
+        records = [
+            {'run_id': run_id, 'operation': op, 'employee': emp, 'name': name, 'month': month, 'fees': fee}
+            for op, emp, name, month, fee in zip(
+                _values(processed_df['Operation']), _values(employees), _values(processed_df['Name']),
+                _values(processed_df['Month']), _values(processed_df['Fees']))
+        ]
+        with self.engine.begin() as conn:
+            if records:
+                conn.execute(insert(processed_fees), records)
+            self._finish_run(conn, run_id, len(records))
+        return len(records)
+
+    def add_audit(self, run_id, audit_df, target=None, sheet=None):
+        """Bulk-insert a cell audit log (the layout of EmployeeCostMapper.audit_frame())."""
+        targets = _values(audit_df['Target']) if 'Target' in audit_df.columns else [target] * len(audit_df)
+        sheets = _values(audit_df['Sheet']) if 'Sheet' in audit_df.columns else [sheet] * len(audit_df)
+        before = pd.to_numeric(audit_df['Fees_before'], errors='coerce')
+        records = [
+            {'run_id': run_id, 'target': tgt, 'sheet': sh, 'operation': op, 'employee': emp, 'month': month,
+             'cell': cell, 'fees_before': fb, 'fees_after': fa}
+            for tgt, sh, op, emp, month, cell, fb, fa in zip(
+                targets, sheets, _values(audit_df['Operation']), _values(audit_df['Employee']),
+                _values(audit_df['Month']), _values(audit_df['Cell']), _values(before),
+                _values(audit_df['Fees_after']))
+        ]
+        with self.engine.begin() as conn:
+            if records:
+                conn.execute(insert(cell_audit), records)
+            self._finish_run(conn, run_id, len(records))
+        return len(records)
+
+    def audit_frame(self, run_id=None):
+        """The cell audit log of one run (default: latest update) in the audit chunk layout."""
+        run_id = run_id if run_id is not None else self.latest_run()
+        query = (
+            select(
+                cell_audit.c.operation.label('Operation'), cell_audit.c.employee.label('Employee'),
+                cell_audit.c.month.label('Month'), cell_audit.c.cell.label('Cell'),
+                cell_audit.c.fees_before.label('Fees_before'), cell_audit.c.fees_after.label('Fees_after'),
+            )
+            .where(*self._filters(cell_audit, run_id))
+        )
+        return self._read(query)
+
+    def _read(self, query):
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn)
+
+    def latest_run(self, stage='update'):
+        """Id of the most recent run of stage, or None."""
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.max(runs.c.id)).where(runs.c.stage == stage)).scalar()
+
+    def list_runs(self):
+        return self._read(select(runs).order_by(runs.c.id))
+
+    @staticmethod
+    def _filters(table, run_id=None, operation=None, employee=None, month_from=None, month_to=None):
+        """WHERE clauses on the indexed key columns of table; None means no filter."""
+        filters = []
+        if run_id is not None:
+            filters.append(_match(table.c.run_id, run_id))
+        if operation is not None:
+            filters.append(_match(table.c.operation, operation))
+        if employee is not None:
+            filters.append(_match(table.c.employee, employee))
+        if month_from is not None:
+            filters.append(table.c.month >= month_from)
+        if month_to is not None:
+            filters.append(table.c.month <= month_to)
+        return filters
+
+    def fee_history(self, operation=None, employee=None, month_from=None, month_to=None, processed=False):
+        """Fees per run for the matching keys, oldest run first.
+
+        :param processed: read the processed fees instead of the target cell audit
+        """
+        table = processed_fees if processed else cell_audit
+        filters = self._filters(table, None, operation, employee, month_from, month_to)
+        if processed:
+            columns = [table.c.operation, table.c.employee, table.c.month, table.c.fees]
+        else:
+            columns = [table.c.target, table.c.sheet, table.c.operation, table.c.employee, table.c.month,
+                       table.c.cell, table.c.fees_before, table.c.fees_after]
+        query = (
+            select(runs.c.id.label('run_id'), runs.c.started_at, *columns)
+            .select_from(table.join(runs, runs.c.id == table.c.run_id))
+            .where(*filters)
+            .order_by(runs.c.id, table.c.operation, table.c.employee, table.c.month)
+        )
+        return self._read(query)
+
+    def summarize_operations(self, run_id=None, operation=None):
+        """analyst.summarize_operations_employees computed in SQL for one run (default: latest update)."""
+        run_id = run_id if run_id is not None else self.latest_run()
+        filters = self._filters(cell_audit, run_id, operation)
+        real_fee = case((cell_audit.c.fees_after != -1, cell_audit.c.fees_after))
+        totals = (
+            select(
+                cell_audit.c.operation.label('Operation'),
+                func.count(distinct(cell_audit.c.employee)).label('NumEmployees'),
+                func.sum(real_fee).label('TotalCost'),
+            )
+            .where(*filters)
+            .group_by(cell_audit.c.operation)
+            .subquery()
+        )
+        # Lowest real fee per operation; ties go to the first (employee, month), as in analyst
+        ranked = (
+            select(
+                cell_audit.c.operation,
+                cell_audit.c.employee,
+                cell_audit.c.fees_after,
+                func.row_number().over(
+                    partition_by=cell_audit.c.operation,
+                    order_by=(cell_audit.c.fees_after, cell_audit.c.employee, cell_audit.c.month),
+                ).label('rank'),
+            )
+            .where(*filters, cell_audit.c.fees_after != -1)
+            .subquery()
+        )
+        query = (
+            select(
+                totals.c.Operation, totals.c.NumEmployees, totals.c.TotalCost,
+                ranked.c.employee.label('LowestCostEmployee'), ranked.c.fees_after.label('LowestCost'),
+            )
+            .join(ranked, (ranked.c.operation == totals.c.Operation) & (ranked.c.rank == 1), isouter=True)
+            .order_by(totals.c.Operation)
+        )
+        return self._read(query)
+
+    def average_spent_per_month(self, run_id=None, operation=None, month_from=None, month_to=None):
+        """analyst.average_spent_per_month computed in SQL for one run (default: latest update)."""
+        run_id = run_id if run_id is not None else self.latest_run()
+        filters = self._filters(cell_audit, run_id, operation, None, month_from, month_to)
+        query = (
+            select(
+                cell_audit.c.operation.label('Operation'),
+                cell_audit.c.month.label('Month'),
+                func.avg(cell_audit.c.fees_after).label('AverageSpent'),
+            )
+            .where(*filters, cell_audit.c.fees_after != -1)
+            .group_by(cell_audit.c.operation, cell_audit.c.month)
+            .order_by(cell_audit.c.operation, cell_audit.c.month)
+        )
+        return self._read(query)
+
+
+def history_from_argv(argv):
+    """HistoryStore for --history[=<path>], or None without the flag."""
+    for arg in argv:
+        if arg == '--history':
+            return HistoryStore()
+        if arg.startswith('--history='):
+            return HistoryStore(arg.split('=', 1)[1])
+    return None
@@ -0,0 +1,149 @@
+# insights.py
+import asyncio
+import hashlib
+import json
+import os
+
+from file_utils import evict_lru, touch, write_json
+
+DEFAULT_CACHE_DIR = "../cache/insights"
+
+INSIGHT_TEMPLATE = """
+### Context
+You are given data on operations and employee fees from an organizational setting. The dataset includes anonymized information such as operation names, employee identities, fees related to employee participation in operations, and total costs associated with each operation.
+
+### Task
+Your task is to analyze the provided summary of operational costs and employee contributions. The goal is to extract key insights about financial distribution and personnel involvement.
+
+### Insights Required
+1. **Financial Analysis**:
+- Identify the operations with the highest and lowest total costs.
+- Discuss notable differences in cost distribution across operations.
+
+2. **Personnel Impact**:
+- Highlight employees with the lowest costs per operation.
+- Describe potential reasons for cost discrepancies.
+
+3. **Patterns and Anomalies**:
+- Pinpoint any unusual patterns in operations or costs that could indicate inefficiencies or areas for improvement.
+
+4. **Recommendations**:
+- Suggest steps to optimize expenses and improve employee participation efficiency.
+
+### Analysis Output
+Based on the above context and data summary, provide a comprehensive analysis with insights and recommendations.
+
+{question}
+"""
+
+
+class OllamaBackend:
+    """Runs prompts through INSIGHT_TEMPLATE and a local Ollama model via langchain."""
+
+    def __init__(self, model="mistral:latest", temperature=0.3, template=INSIGHT_TEMPLATE):
+        self.model = model
+        self.temperature = temperature
+        self.template = template
+        self._chain = None
+
+    def _get_chain(self):
+        if self._chain is None:
+            # Imported here so the LLM stack is only loaded when a model is actually called
+            from langchain_core.prompts import ChatPromptTemplate
+            from langchain_ollama.llms import OllamaLLM
+
+            prompt = ChatPromptTemplate.from_template(self.template)
+            self._chain = prompt | OllamaLLM(model=self.model, temperature=self.temperature)
+        return self._chain
+
+    async def agenerate(self, prompt):
+        return await self._get_chain().ainvoke({"question": prompt})
+
+
+class FakeLLM:
+    """Deterministic offline stand-in for OllamaBackend, for tests and dry runs.
+
+    The response depends only on the prompt, so cached and fresh results compare equal.
+    """
+
+    def __init__(self, model="fake", temperature=0.0, template=INSIGHT_TEMPLATE):
+        self.model = model
+        self.temperature = temperature
+        self.template = template
+        self.calls = 0
+
+    async def agenerate(self, prompt):
+        self.calls += 1
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        lines = [line for line in prompt.splitlines() if line.strip()]
+        return f"[fake:{digest}] {len(lines)} prompt lines; last: {lines[-1] if lines else ''}"
+
+
+class ResponseCache:
+    """Model responses stored as one JSON file per key, evicting the least recently used."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=256):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(prompt, backend):
+        payload = json.dumps({
+            "template": getattr(backend, "template", None),
+            "prompt": prompt,
+            "model": backend.model,
+            "temperature": backend.temperature,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                response = json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+        touch(path)
+        return response
+
+    def put(self, key, response):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        write_json(path, {"response": response}, ensure_ascii=False)
+        evict_lru(self.cache_dir, ".json", max_entries=self.max_entries, keep=path)
+
+
+async def generate_insights_async(summary_df, backend, prompt_builder, cache=None, max_concurrency=4):
+    """Generate one insight per operation of summary_df, at most max_concurrency at a time.
+
+    :param prompt_builder: turns a one-operation summary DataFrame into a prompt
+        (e.g. analyst.analysis_prompt)
+    :param cache: ResponseCache; cached prompts are answered without calling the backend
+    :return: dict operation -> response
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(operation, prompt):
+        key = ResponseCache.key(prompt, backend)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return operation, cached
+        async with semaphore:
+            response = await backend.agenerate(prompt)
+        if cache is not None:
+            cache.put(key, response)
+        return operation, response
+
+    tasks = []
+    for operation, op_summary in summary_df.groupby('Operation', sort=False, observed=True):
+        tasks.append(run(operation, prompt_builder(op_summary)))
+    return dict(await asyncio.gather(*tasks))
+
+
+def generate_insights(summary_df, backend, prompt_builder, cache=None, max_concurrency=4):
+    """Synchronous wrapper around generate_insights_async."""
+    return asyncio.run(generate_insights_async(summary_df, backend, prompt_builder, cache, max_concurrency))
@@ -0,0 +1,133 @@
+# instrumentation.py
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("operation_costs")
+metrics_logger = logging.getLogger("operation_costs.metrics")
+# Span metrics are kept for get_records()/write_report(); they only reach the
+# console logs if configure() is given a stream for them
+metrics_logger.propagate = False
+metrics_logger.setLevel(logging.INFO)
+metrics_logger.addHandler(logging.NullHandler())
+
+_records = []
+_stack = []
+
+
+def configure(trace_memory=False, level=logging.INFO, metrics_stream=None):
+    """Set up console logging and, optionally, tracemalloc-based peak memory for spans.
+
+    Log records are plain messages so the console output reads like the old prints.
+    Span metrics go to the 'operation_costs.metrics' logger as one JSON object each;
+    it has its own handler and does not propagate to the console handler.
+
+    :param metrics_stream: stream to write the metrics records to (default: none)
+    """
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=level, format="%(message)s")
+    logger.setLevel(level)
+    if metrics_stream is not None:
+        for handler in list(metrics_logger.handlers):
+            metrics_logger.removeHandler(handler)
+        handler = logging.StreamHandler(metrics_stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        metrics_logger.addHandler(handler)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def span(stage, **fields):
+    """Measure one pipeline stage.
+
+    Yields the metrics record; set record['rows'] (or other fields) inside the block.
+    On exit the record holds wall_s, cpu_s and, when memory tracing is on (else None):
+    peak_mb, the traced high-water mark of the process at the end of the span, and
+    peak_delta_mb, how far the span (with the spans nested in it) raised that mark.
+    The record is kept for get_records() and logged as JSON.
+
+    The tracemalloc peak is only read, never reset, so measurements around the span
+    (a benchmark's own tracemalloc window, an outer span) see the true peak.
+    """
+    record = {'stage': stage, **fields}
+    parent = _stack[-1] if _stack else None
+    tracing = tracemalloc.is_tracing()
+    peak_start = tracemalloc.get_traced_memory()[1] if tracing else None
+    _stack.append(record)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        _stack.pop()
+        peak = tracemalloc.get_traced_memory()[1] if tracing and tracemalloc.is_tracing() else None
+        record['peak_mb'] = round(peak / 2 ** 20, 2) if peak is not None else None
+        record['peak_delta_mb'] = round((peak - peak_start) / 2 ** 20, 2) if peak is not None else None
+        if parent is not None:
+            record['parent'] = parent['stage']
+        _records.append(record)
+        metrics_logger.info(json.dumps(record, default=str))
+
+
+def get_records():
+    return list(_records)
+
+
+def reset_records():
+    _records.clear()
+
+
+def write_report(path):
+    """Write every span recorded so far to path as a JSON list."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(_records, f, indent=2, default=str)
+    logger.info(f"Stage metrics saved to: {path}")
+
+
+@contextmanager
+def profiled(enabled=True, output_path=None, top=25):
+    """Run the block under cProfile when enabled.
+
+    The stats are dumped to output_path (if given, for snakeviz/pstats) and the
+    top entries by cumulative time are logged.
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if output_path:
+            profiler.dump_stats(output_path)
+            logger.info(f"Profile saved to: {output_path}")
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+        logger.info(output.getvalue())
+
+
+def cli_options(argv):
+    """Parse the shared instrumentation flags: --trace-memory, --metrics=<path>, --profile[=<path>]."""
+    options = {'trace_memory': '--trace-memory' in argv, 'metrics_path': None,
+               'profile': False, 'profile_path': None}
+    for arg in argv:
+        if arg.startswith('--metrics='):
+            options['metrics_path'] = arg.split('=', 1)[1]
+        elif arg == '--profile':
+            options['profile'] = True
+        elif arg.startswith('--profile='):
+            options['profile'] = True
+            options['profile_path'] = arg.split('=', 1)[1]
+    return options
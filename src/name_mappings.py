@@ -1,3 +1,8 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+
 NAME_MAP = {
     "Assuncao Gambetta Clemente, Fernanda": [
         "Assuncao Gambetta Clemente, Fernanda",
@@ -100,11 +105,100 @@ for canonical, aliases in NAME_MAP.items():
     for alias in aliases:
         ALIAS_TO_CANONICAL[alias.strip().lower()] = canonical
 
+@lru_cache(maxsize=4096)
 def normalize_name(name):
     if not name:
         return None
     return ALIAS_TO_CANONICAL.get(name.strip().lower(), name.strip())
 
+
+def normalize_series(series, normalize_func=normalize_name):
+    """Normalize a column of names by resolving each distinct value once.
+
+    Missing values map to None. Categorical input stays categorical (one call per category).
+    """
+    if hasattr(series, 'cat'):
+        from schema import map_categories
+        return map_categories(series, normalize_func)
+    uniques = series.dropna().unique()
+    resolved = {name: normalize_func(name) for name in uniques}
+    return series.map(resolved).astype(object).where(series.notna(), None)
+
+
+def _fuzzy_key(name):
+    """Accent-, case- and order-insensitive form of a name, e.g. 'bjorn helbing'."""
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r'\(.*?\)', ' ', text)  # drop qualifiers such as '(ext)'
+    return ' '.join(sorted(re.findall(r'[a-z]+', text)))
+
+
+def _ngrams(key, n=3):
+    padded = f"  {key} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NameIndex:
+    """Trigram index over the canonical names and aliases in NAME_MAP.
+
+    Only aliases sharing at least one trigram with the query are scored, so a
+    lookup touches a small block of the roster instead of every alias.
+    """
+
+    def __init__(self, name_map=None, n=3):
+        self.n = n
+        self.entries = []  # (trigram set, canonical name)
+        self.postings = defaultdict(list)  # trigram -> entry positions
+        keys = {}
+        for canonical, aliases in (name_map or NAME_MAP).items():
+            for alias in [canonical, *aliases]:
+                keys[_fuzzy_key(alias)] = canonical
+        for key, canonical in keys.items():
+            grams = _ngrams(key, n)
+            for gram in grams:
+                self.postings[gram].append(len(self.entries))
+            self.entries.append((grams, canonical))
+
+    def suggest(self, name, threshold=0.6):
+        """Return (canonical, score) for the closest alias, or None below threshold.
+
+        The score is the Dice coefficient of the trigram sets (1.0 = identical).
+        """
+        grams = _ngrams(_fuzzy_key(name), self.n)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        best = None
+        for pos, count in shared.items():
+            entry_grams, canonical = self.entries[pos]
+            score = 2 * count / (len(grams) + len(entry_grams))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (canonical, score)
+        return best
+
+
+@lru_cache(maxsize=1)
+def get_name_index():
+    return NameIndex()
+
+
+@lru_cache(maxsize=4096)
+def suggest_canonical(name, threshold=0.6):
+    """Suggest the nearest canonical name for a name that has no exact alias."""
+    return get_name_index().suggest(name, threshold)
+
+
+def unknown_name_suggestions(names, threshold=0.6):
+    """Map names that are neither canonical nor a known alias to a suggestion (or None)."""
+    canonical_names = set(NAME_MAP)
+    suggestions = {}
+    for name in set(names):
+        if not isinstance(name, str) or not name.strip():
+            continue
+        if name in canonical_names or name.strip().lower() in ALIAS_TO_CANONICAL:
+            continue
+        suggestions[name] = suggest_canonical(name, threshold)
+    return suggestions
+
 # rows to skip 
 SKIP_NAMES = [
         "Test - ARE 5240", "Service Management - ARE 5290 + int.", "JCC",
@@ -0,0 +1,94 @@
+# pipeline.py
+import os
+
+from dataProcessor import TimeSheetUpdater
+from updater import EmployeeCostMapper
+from name_mappings import SKIP_NAMES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_FILE = os.path.abspath(os.path.join(BASE_DIR, "../docs/source_timesheet.xlsx"))
+TARGET_FILE = os.path.abspath(os.path.join(BASE_DIR, "../docs/target_sheet.xlsx"))
+PROCESSED_FILE = os.path.abspath(os.path.join(BASE_DIR, "../docs/processed_timesheet.xlsx"))
+SHEET_NAME = "Project"
+
+
+def run_process_stage(source_path=SOURCE_FILE, processed_path=None, use_cache=True, streaming=False,
+                      save_chunks=False, chunk_format='xlsx', work_packages_path=None, history=None):
+    """TimeSheetUpdater stage: source timesheet -> processed DataFrame.
+
+    :param processed_path: also write the processed workbook here (None keeps it in memory only)
+    :param work_packages_path: work package config (default: work_packages.DEFAULT_CONFIG_PATH)
+    :param history: HistoryStore to record the processed fees in
+    """
+    updater = TimeSheetUpdater(work_packages_path)
+    updater.load_and_process_data(source_path, use_cache=use_cache, streaming=streaming,
+                                  chunk_format=chunk_format, save_chunks=save_chunks, history=history)
+    processed_df = updater.process_all_chunks()
+    if processed_path:
+        updater.save_processed_data(processed_df, processed_path)
+    return processed_df
+
+
+def run_update_stage(processed_df, target_path=TARGET_FILE, target_sheet=SHEET_NAME, save_audit_chunks=False,
+                     chunk_format='xlsx', history=None):
+    """EmployeeCostMapper stage: processed DataFrame -> updated target workbook and audit DataFrame."""
+    mapper = EmployeeCostMapper(target_path, None, target_sheet, SKIP_NAMES, processed_df=processed_df,
+                                history=history)
+    mapper.map_employees()
+    mapper.update_costs()
+    if save_audit_chunks:
+        mapper.save_audit_chunks(fmt=chunk_format)
+    return mapper.audit_frame()
+
+
+def run_analysis_stage(audit_df):
+    """Analysis stage: audit DataFrame -> (operation summary, average spent per month)."""
+    # Only import analyst when analysis runs (--no-analysis skips it entirely)
+    from analyst import build_cost_cube, summarize_operations_employees, average_spent_per_month
+    cube = build_cost_cube(audit_df)
+    return summarize_operations_employees(audit_df, cube), average_spent_per_month(audit_df, cube)
+
+
+def run_pipeline(source_path=SOURCE_FILE, target_path=TARGET_FILE, target_sheet=SHEET_NAME,
+                 write_intermediates=False, use_cache=True, streaming=False, chunk_format='xlsx', analyze=True,
+                 history=None):
+    """Run TimeSheetUpdater -> EmployeeCostMapper -> analysis on in-memory DataFrames.
+
+    Only the updated target workbook is always written. With write_intermediates the
+    processed workbook, processed chunks and audit chunks are written as well, as the
+    standalone scripts do. With a HistoryStore, both stages record their outputs in it.
+    """
+    processed_df = run_process_stage(source_path, PROCESSED_FILE if write_intermediates else None,
+                                     use_cache=use_cache, streaming=streaming,
+                                     save_chunks=write_intermediates, chunk_format=chunk_format, history=history)
+    audit_df = run_update_stage(processed_df, target_path, target_sheet,
+                                save_audit_chunks=write_intermediates, chunk_format=chunk_format, history=history)
+    results = {'processed': processed_df, 'audit': audit_df}
+    if analyze:
+        results['summary'], results['avg_spent_per_month'] = run_analysis_stage(audit_df)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    from cli import flag, history_option
+    from instrumentation import configure, cli_options, profiled, write_report
+
+    options = cli_options(sys.argv)
+    configure(trace_memory=options['trace_memory'])
+    chunk_format = flag(sys.argv, 'chunk-format', 'xlsx')
+    history = history_option(sys.argv)
+    with profiled(options['profile'], options['profile_path']):
+        results = run_pipeline(
+            write_intermediates='--write-intermediates' in sys.argv,
+            use_cache='--no-cache' not in sys.argv,
+            streaming='--streaming' in sys.argv,
+            chunk_format=chunk_format,
+            analyze='--no-analysis' not in sys.argv,
+            history=history,
+        )
+    if options['metrics_path']:
+        write_report(options['metrics_path'])
+    if 'summary' in results:
+        print("\nOperation summary:")
+        print(results['summary'].to_string(index=False))
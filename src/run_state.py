@@ -0,0 +1,71 @@
+# run_state.py
+import hashlib
+import json
+import os
+
+from file_utils import write_json
+
+DEFAULT_STATE_PATH = "../state/run_state.json"
+KEY_SEP = "\t"
+
+
+def fee_hashes(keys, fees):
+    """Map each (Operation, Name, Month) key to a short hash of its fee.
+
+    Keys are joined into strings so the result can be stored as JSON.
+    Numeric fees are hashed as Python floats, so the hash does not depend on the
+    column's dtype (int32 vs int64 vs float64).
+    """
+    hashes = {}
+    for key, fee in zip(keys, fees):
+        hashes[KEY_SEP.join(str(part) for part in key)] = hashlib.sha1(_fee_repr(fee).encode("utf-8")).hexdigest()[:16]
+    return hashes
+
+
+def _fee_repr(fee):
+    if hasattr(fee, "item"):  # NumPy scalar -> Python scalar
+        fee = fee.item()
+    if isinstance(fee, int) and not isinstance(fee, bool):
+        fee = float(fee)
+    return repr(fee)
+
+
+def split_key(key):
+    return tuple(key.split(KEY_SEP))
+
+
+class RunState:
+    """Per-key fee hashes from the previous run, grouped in named sections.
+
+    Sections keep the stages apart, e.g. 'processed' for TimeSheetUpdater and
+    one 'target:<workbook>:<sheet>' section per updated sheet.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.sections = json.load(f)
+        except (OSError, ValueError):
+            self.sections = {}
+
+    def previous(self, section):
+        return self.sections.get(section, {})
+
+    def diff(self, section, hashes):
+        """Compare hashes with the previous run.
+
+        :return: (changed, removed) where changed holds keys that were added or whose
+            fee hash differs, and removed holds keys missing from hashes
+        """
+        previous = self.previous(section)
+        changed = {key for key, value in hashes.items() if previous.get(key) != value}
+        removed = set(previous) - set(hashes)
+        return changed, removed
+
+    def update(self, section, hashes):
+        self.sections[section] = dict(hashes)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        write_json(self.path, self.sections, ensure_ascii=False)
@@ -0,0 +1,197 @@
+# schema.py
+from array import array
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+PROCESSED_LABELS = ('Operation', 'Name', 'Name_norm', 'Operation_norm', 'Period')
+AUDIT_LABELS = ('Operation', 'Employee')
+FEE_COLUMNS = ('Fees', 'Fees_before', 'Fees_after')
+
+
+def whole_int32(values):
+    """Return values as int32 when every value is a whole number that fits, else unchanged."""
+    numeric = pd.to_numeric(values, errors='coerce')
+    if len(numeric) and numeric.notna().all() and (numeric % 1 == 0).all() and numeric.abs().max() < 2 ** 31:
+        return numeric.astype('int32')
+    return numeric
+
+
+def month_categorical(values):
+    """'YYYY-MM' labels as an ordered categorical, so the codes are month ordinals."""
+    values = pd.Series(values)
+    categories = sorted(values.dropna().unique())
+    return pd.Categorical(values, categories=categories, ordered=True)
+
+
+def compact_dtypes(df, labels=PROCESSED_LABELS + AUDIT_LABELS):
+    """Categoricals for repeated labels, month-ordinal codes for Month and int32 fees.
+
+    Only columns present in df are converted; the fee columns keep their float dtype
+    when a value is missing or fractional.
+    """
+    df = df.copy(deep=False)
+    for col in labels:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    if 'Month' in df.columns and not isinstance(df['Month'].dtype, pd.CategoricalDtype):
+        df['Month'] = month_categorical(df['Month'].to_numpy())
+    for col in FEE_COLUMNS:
+        if col in df.columns and df[col].dtype != 'int32':
+            df[col] = whole_int32(df[col])
+    return df
+
+
+def map_categories(series, func):
+    """Apply func to each category of a categorical series instead of to every row.
+
+    Categories that map to the same value are merged and None becomes missing.
+    """
+    categories = series.cat.categories
+    if len(categories) == 0:
+        return series.copy()
+    category_codes, uniques = pd.factorize(np.array([func(value) for value in categories], dtype=object))
+    codes = series.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, category_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=uniques),
+                     index=series.index, name=series.name)
+
+
+def strip_labels(series):
+    """str.strip() that keeps categoricals categorical."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return map_categories(series, lambda value: str(value).strip())
+    return series.str.strip()
+
+
+class AuditEntry:
+    """One target cell of the audit log (a row view of AuditLog)."""
+    __slots__ = ('operation', 'employee', 'month', 'cell', 'fees_before', 'fees_after')
+
+    def __init__(self, operation, employee, month, cell, fees_before, fees_after):
+        self.operation = operation
+        self.employee = employee
+        self.month = month
+        self.cell = cell
+        self.fees_before = fees_before
+        self.fees_after = fees_after
+
+    def key(self):
+        return (self.operation, self.employee, self.month)
+
+
+class _Labels:
+    """Interning table: label -> integer code and back."""
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class AuditLog:
+    """Before/after fees of every mapped target cell, stored column-wise in typed arrays.
+
+    Operation, employee and month are interned to int32 codes, the cell as its row and
+    column number, and the fees as float64 (NaN = not filled yet). Target cells holding
+    text are kept aside so the frame shows them as they were.
+    """
+    COLUMNS = ['Operation', 'Employee', 'Month', 'Cell', 'Fees_before', 'Fees_after']
+
+    def __init__(self):
+        self._operations = _Labels()
+        self._employees = _Labels()
+        self._months = _Labels()
+        self.operation_codes = array('i')
+        self.employee_codes = array('i')
+        self.month_codes = array('i')
+        self.rows = array('l')
+        self.cols = array('i')
+        self.fees_before = array('d')
+        self.fees_after = array('d')
+        self._text_before = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, operation, employee, month, row, col, fees_before):
+        self.operation_codes.append(self._operations.code(operation))
+        self.employee_codes.append(self._employees.code(employee))
+        self.month_codes.append(self._months.code(month))
+        self.rows.append(row)
+        self.cols.append(col)
+        if isinstance(fees_before, (int, float, np.number)):
+            self.fees_before.append(fees_before)
+        else:
+            self._text_before[len(self.fees_before)] = fees_before
+            self.fees_before.append(float('nan'))
+        self.fees_after.append(float('nan'))
+
+    def set_after(self, i, fee):
+        self.fees_after[i] = float(fee)
+
+    def cell(self, i):
+        return f"{get_column_letter(self.cols[i])}{self.rows[i]}"
+
+    def keys(self):
+        """(Operation, Employee, Month) of every entry, in order."""
+        operations, employees, months = self._operations.values, self._employees.values, self._months.values
+        for op, emp, month in zip(self.operation_codes, self.employee_codes, self.month_codes):
+            yield operations[op], employees[emp], months[month]
+
+    def employees(self):
+        return set(self._employees.values)
+
+    def __getitem__(self, i):
+        before = self._text_before.get(i, self.fees_before[i])
+        after = self.fees_after[i]
+        return AuditEntry(self._operations.values[self.operation_codes[i]],
+                          self._employees.values[self.employee_codes[i]],
+                          self._months.values[self.month_codes[i]],
+                          self.cell(i), before, None if after != after else after)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @staticmethod
+    def _categorical(codes, labels, ordered=False):
+        codes = np.frombuffer(codes, dtype=np.int32) if len(codes) else np.empty(0, dtype=np.int32)
+        if not ordered:
+            return pd.Categorical.from_codes(codes, categories=labels)
+        order = np.argsort(np.array(labels, dtype=object))
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return pd.Categorical.from_codes(rank[codes], categories=[labels[i] for i in order], ordered=True)
+
+    def to_frame(self, dropna=False):
+        """The log as a compact DataFrame (see compact_dtypes).
+
+        :param dropna: drop entries without a before or after fee, as the saved audit chunks do
+        """
+        letters = {col: get_column_letter(col) for col in set(self.cols)}
+        before = np.array(self.fees_before, dtype='float64')
+        if self._text_before:
+            before = before.astype(object)
+            for i, value in self._text_before.items():
+                before[i] = value
+        df = pd.DataFrame({
+            'Operation': self._categorical(self.operation_codes, self._operations.values),
+            'Employee': self._categorical(self.employee_codes, self._employees.values),
+            'Month': self._categorical(self.month_codes, self._months.values, ordered=True),
+            'Cell': [f"{letters[col]}{row}" for col, row in zip(self.cols, self.rows)],
+            'Fees_before': before,
+            'Fees_after': np.array(self.fees_after, dtype='float64'),
+        }, columns=self.COLUMNS)
+        if dropna:
+            df = df.dropna(subset=['Fees_before', 'Fees_after'])
+        for col in ('Fees_before', 'Fees_after'):
+            df[col] = whole_int32(df[col]) if df[col].dtype != object else df[col]
+        return df
@@ -0,0 +1,132 @@
+# sheet_layout.py
+import hashlib
+import json
+import os
+
+from file_utils import write_json
+
+DEFAULT_CACHE_DIR = "../cache/layouts"
+
+
+def digest(*parts):
+    """Short hash of the repr of parts (cell values, label sets, ...)."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def month_columns(header, first_col=6):
+    """Map each month in the header row ('YYYY-MM' text or a date) to its column index.
+
+    :param header: header row values starting at column first_col
+    """
+    month_col_map = {}
+    for col, cell_value in enumerate(header, start=first_col):
+        if cell_value:
+            # Normalize to 'YYYY-MM' string
+            if isinstance(cell_value, str) and cell_value[:4].isdigit():
+                period = cell_value[:7]
+            elif hasattr(cell_value, 'strftime'):
+                period = cell_value.strftime('%Y-%m')
+            else:
+                continue
+            month_col_map[period] = col
+    return month_col_map
+
+
+def section_entries(sections):
+    """(row, operation, employee) of every employee row in the layout's sections."""
+    for section in sections:
+        row, operation = section['row'], section['operation']
+        for offset, employee in section['employees']:
+            yield row + offset, operation, employee
+
+
+class LayoutCache:
+    """Persisted layout of target sheets: month columns and employee rows per operation section.
+
+    One JSON file per workbook sheet holds the month -> column map (keyed by a
+    digest of the header row) and the operation sections of column E. Each
+    section stores its first row, a digest of its column E values and its
+    employees as (row offset, name), so a section that only moved (rows added
+    above it) is reused as is. The whole column is fingerprinted too, so an
+    unchanged sheet costs one hash.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, enabled=True):
+        """
+        :param enabled: when False layouts are always rebuilt and nothing is written
+        """
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self._entries = {}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{digest(key)}.json")
+
+    def _entry(self, key):
+        if key not in self._entries:
+            entry = {}
+            if self.enabled:
+                try:
+                    with open(self._path(key), encoding="utf-8") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    pass
+            self._entries[key] = entry
+        return self._entries[key]
+
+    def _save(self, key):
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_json(self._path(key), self._entries[key], ensure_ascii=False)
+
+    def month_columns(self, key, header):
+        """month_columns(header), reused while the header row is unchanged."""
+        entry = self._entry(key)
+        header_digest = digest(header)
+        if entry.get('header') != header_digest:
+            entry['header'] = header_digest
+            entry['month_col_map'] = month_columns(header)
+            self._save(key)
+        return entry['month_col_map']
+
+    def sections(self, key, column_e, context, is_operation, employee_of):
+        """Operation sections of column E, rebuilding only the sections that changed.
+
+        :param column_e: column E values from row 2 down to the row before 'Accumulated Total'
+        :param context: everything else the classification depends on (operation
+            names, skip names, name aliases); a change invalidates every section
+        :param is_operation: value -> True if it starts a section
+        :param employee_of: value -> employee name, or None for rows to skip
+        :return: (sections, rebuilt) where rebuilt is the number of sections classified
+            row by row (0 when the cached layout was reused)
+        """
+        entry = self._entry(key)
+        fingerprint = digest(context, column_e)
+        if entry.get('fingerprint') == fingerprint:
+            return entry['sections'], 0
+
+        cached = {section['digest']: section['employees'] for section in entry.get('sections', [])}
+        starts = [i for i, value in enumerate(column_e) if is_operation(value)]
+        sections = []
+        rebuilt = 0
+        for n, start in enumerate(starts):
+            end = starts[n + 1] if n + 1 < len(starts) else len(column_e)
+            operation = str(column_e[start]).strip()
+            values = column_e[start + 1:end]
+            section_digest = digest(context, operation, values)
+            employees = cached.get(section_digest)
+            if employees is None:
+                rebuilt += 1
+                employees = []
+                for offset, value in enumerate(values, start=1):
+                    employee = employee_of(value)
+                    if employee:
+                        employees.append([offset, employee])
+            # Rows are counted from 2, the first row below the header
+            sections.append({'operation': operation, 'row': start + 2, 'digest': section_digest,
+                             'employees': employees})
+        entry['fingerprint'] = fingerprint
+        entry['sections'] = sections
+        self._save(key)
+        return sections, rebuilt
@@ -1,46 +1,152 @@
+from copy import copy
+
 import pandas as pd
 from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font
-from name_mappings import ALIAS_TO_CANONICAL, normalize_name, SKIP_NAMES
+from name_mappings import ALIAS_TO_CANONICAL, normalize_name, normalize_series, unknown_name_suggestions, SKIP_NAMES
+from frame_cache import read_excel_cached
+from chunk_writer import ChunkWriter
+from file_utils import file_sha256
+from run_state import RunState, fee_hashes, split_key
+from instrumentation import logger, span
+from xlsx_patch import XlsxPatcher
+from schema import AuditLog, strip_labels
+from sheet_layout import LayoutCache, section_entries
 import os
 
+def build_fee_index(processed_df):
+    """Index processed fees by (Operation_norm, Name_norm, Month).
+
+    The first row wins for a repeated key (same as the old mask lookup).
+
+    :return: (fee_index, duplicates) where duplicates maps each repeated key to its row count
+    """
+    keys = zip(
+        processed_df['Operation_norm'],
+        processed_df['Name_norm'],
+        processed_df['Month'],
+    )
+    fee_index = {}
+    duplicates = {}
+    for key, fee in zip(keys, processed_df['Fees'].values):
+        if key in fee_index:
+            duplicates[key] = duplicates.get(key, 1) + 1
+            continue
+        fee_index[key] = fee
+    return fee_index, duplicates
+
+
 class EmployeeCostMapper:
-    def __init__(self, target_path, processed_path, target_sheet='Project', skip_names=None):
+    def __init__(self, target_path, processed_path, target_sheet='Project', skip_names=None, read_only=False, use_cache=True,
+                 incremental=False, state=None, processed_df=None, writer='patch', base_path=None,
+                 fee_index=None, history=None, rewrite_unchanged=False):
+        """
+        :param use_cache: serve the processed workbook from the frame cache and reuse the
+            cached sheet layout (see sheet_layout.LayoutCache)
+        :param read_only: stream the target sheet with openpyxl's read-only mode while
+            mapping; a writable workbook is only loaded if the openpyxl writer is used
+        :param incremental: start from the previous run's '_updated' workbook and only
+            rewrite cells whose fee changed since that run; falls back to a full run
+            from target_path when the target workbook changed since that run
+        :param state: RunState holding the previous run's fee hashes (default location if None)
+        :param processed_df: processed timesheet already in memory (e.g. from
+            TimeSheetUpdater); processed_path is not read when it is given
+        :param writer: 'patch' edits only the updated cells in the sheet XML (formulas
+            elsewhere survive); 'openpyxl' loads and re-saves the whole workbook
+        :param base_path: workbook to read and apply the updates to (default: target_path,
+            or the previous output in incremental mode); used to chain several sheets of
+            one workbook into the same output
+        :param fee_index: prebuilt (index, duplicates) from build_fee_index, shared when
+            many targets are updated from the same processed data
+        :param history: HistoryStore to record the cell audit log in, tagged with a new run id
+        :param rewrite_unchanged: also rewrite (and highlight) cells that already hold
+            their new fee; by default only cells whose value changes are written
+        """
         self.target_path = target_path
         self.processed_path = processed_path
         self.target_sheet = target_sheet
+        self.read_only = read_only
+        self.writer = writer
+        stem, ext = os.path.splitext(target_path)
+        self.output_path = f"{stem}_updated{ext}"
+        # Macro-enabled workbooks keep their VBA project when saved through openpyxl
+        self.keep_vba = ext.lower() == '.xlsm'
+        self.incremental = incremental
+        self.state = (state or RunState()) if incremental else None
+        self.state_section = f"target:{os.path.abspath(target_path)}:{target_sheet}"
+        self.fingerprint_section = f"workbook:{os.path.abspath(target_path)}"
+        self.target_sha256 = file_sha256(target_path) if incremental else None
+        # Incremental runs build on the last written output so unchanged cells keep their update,
+        # as long as the target workbook is the one that output was made from
+        if base_path:
+            self.workbook_path = base_path
+        elif incremental and os.path.exists(self.output_path) and self._target_unchanged():
+            self.workbook_path = self.output_path
+        else:
+            if incremental and os.path.exists(self.output_path):
+                logger.info(f"{self.output_path} was not made from the current {target_path}; updating all cells")
+            self.workbook_path = target_path
+        # Only a run on top of the previous output can limit itself to the changed cells
+        self.from_previous = incremental and self.workbook_path == self.output_path
         self.normalize_name = normalize_name
-        self.processed_df = pd.read_excel(self.processed_path)
-        # Load workbook for updating (formulas)
-        self.wb = load_workbook(self.target_path,data_only=True)
+        self.history = history
+        self.rewrite_unchanged = rewrite_unchanged
+        if processed_df is None:
+            processed_df = read_excel_cached(self.processed_path, use_cache=use_cache)
+        self.set_processed(processed_df, fee_index)
+        # Load the workbook once; it serves both the before-values and the update
+        self.wb = load_workbook(self.workbook_path, data_only=True, read_only=read_only, keep_vba=self.keep_vba)
         self.ws = self.wb[self.target_sheet]
-        # Load workbook for values (data_only=True)
-        self.wb_values = load_workbook(self.target_path, data_only=True)
-        self.ws_values = self.wb_values[self.target_sheet]
+        self.layout_cache = LayoutCache(enabled=use_cache)
+        self.layout_key = f"{os.path.abspath(self.target_path)}:{self.target_sheet}"
         self.month_col_map = self._map_month_columns()
-        self.operation_names = set(self.processed_df['Operation'].unique())
-        self.processed_df['Name_norm'] = self.processed_df['Name'].apply(self.normalize_name)
-        self.processed_df['Operation_norm'] = self.processed_df['Operation'].str.strip()
         self.skip_names = set(n.strip().lower() for n in (skip_names or []))
         self.mapping = []
         
 
+    def _target_unchanged(self):
+        return self.state.previous(self.fingerprint_section).get('sha256') == self.target_sha256
+
+    def set_processed(self, processed_df, fee_index=None):
+        """Use new processed data for the next update_costs.
+
+        :return: True if the set of operations changed, in which case map_employees
+            must run again (operation names delimit the sections of the sheet)
+        """
+        previous = getattr(self, 'operation_names', None)
+        self.processed_df = processed_df.copy(deep=False)
+        self.fee_index = fee_index
+        self.operation_names = set(self.processed_df['Operation'].unique())
+        self.processed_df['Name_norm'] = normalize_series(self.processed_df['Name'], self.normalize_name)
+        self.processed_df['Operation_norm'] = strip_labels(self.processed_df['Operation'])
+        return self.operation_names != previous
+
     def _map_month_columns(self):
         """Map month names to their column indices."""
-        month_col_map = {}
-        for col in range(6, self.ws.max_column + 1):  # Month columns start at F (no.6)
-            cell_value = self.ws.cell(row=1, column=col).value
-            if cell_value:
-                # Normalize to 'YYYY-MM' string
-                if isinstance(cell_value, str) and cell_value[:4].isdigit():
-                    period = cell_value[:7]
-                elif hasattr(cell_value, 'strftime'):
-                    period = cell_value.strftime('%Y-%m')
-                else:
-                    continue
-                month_col_map[period] = col
-        return month_col_map
+        # Month columns start at F (no.6)
+        header = next(self.ws.iter_rows(min_row=1, max_row=1, min_col=6, values_only=True), ())
+        return self.layout_cache.month_columns(self.layout_key, header)
+
+    def _load_writable_workbook(self):
+        """Swap a read-only workbook for a writable one before updating cells."""
+        if self.read_only:
+            self.wb.close()
+            self.wb = load_workbook(self.workbook_path, data_only=True, keep_vba=self.keep_vba)
+            self.ws = self.wb[self.target_sheet]
+            self.read_only = False
+
+    def _report_name_suggestions(self, names, source):
+        """Print names without an exact alias, with the nearest canonical name if any."""
+        suggestions = unknown_name_suggestions(names)
+        if not suggestions:
+            return suggestions
+        logger.info(f"{len(suggestions)} names in {source} have no entry in NAME_MAP:")
+        for name, suggestion in sorted(suggestions.items()):
+            if suggestion:
+                logger.info(f"  - '{name}': did you mean '{suggestion[0]}' (score {suggestion[1]:.2f})?")
+            else:
+                logger.info(f"  - '{name}': no close match")
+        return suggestions
 
     def _is_operation(self, value):
         return value and str(value).strip() in self.operation_names
@@ -48,90 +154,219 @@ class EmployeeCostMapper:
     def _should_skip(self, value):
         return value and str(value).strip().lower() in self.skip_names
 
+    def _employee_of(self, value):
+        """Normalized employee name of a column E value, or None for rows that are not employees."""
+        emp_name = self.normalize_name(value)
+        if not emp_name or emp_name.strip() == '' or self._is_operation(emp_name) or self._should_skip(emp_name):
+            return None
+        return emp_name.strip()
+
+    def _layout_context(self):
+        """What the row classification depends on besides column E itself."""
+        return (sorted(str(op) for op in self.operation_names), sorted(self.skip_names),
+                sorted(ALIAS_TO_CANONICAL.items()))
+
     def map_employees(self):
-        self.cell_audit_log = []
-        current_operation = None
-        for row in range(2, self.ws.max_row + 1):
-            cell_value = self.ws.cell(row=row, column=5).value  # Column E
-
-            # Stop processing if "Accumulated Total" is reached
-            if cell_value and str(cell_value).strip().lower() == "accumulated total":
-                print(f"Reached 'Accumulated Total' at row {row}. Stopping iteration.")
-                break
-
-            # Detect operation section
-            if self._is_operation(cell_value):
-                current_operation = str(cell_value).strip()
-                continue
-
-            if not current_operation:
-                continue
-
-            emp_name = self.normalize_name(cell_value)
-            if not emp_name or emp_name.strip() == '' or self._is_operation(emp_name) or self._should_skip(emp_name):
-                continue
-
-            for period, col in self.month_col_map.items():
-                cell = self.ws.cell(row=row, column=col)
-                cell_address = f"{get_column_letter(col)}{row}"
-                # Use the value from the value-only workbook for Fees_before
-                before_val = self.ws_values.cell(row=row, column=col).value
-                # Set Fees_before to -1 if missing
-                if before_val is None or (isinstance(before_val, float) and pd.isna(before_val)):
-                    before_val = -1
-
-                # Store BEFORE update. After update will be filled in next step.
-                self.cell_audit_log.append({
-                    'Operation': current_operation,
-                    'Employee': emp_name.strip(),
-                    'Month': period,
-                    'Cell': cell_address,
-                    'Fees_before': before_val,
-                    'Fees_after': None  # Filled after updating
-                })
-        # Done mapping! self.cell_audit_log = full before-state
+        with span('map_employees') as record:
+            self.cell_audit_log = AuditLog()
+            # Offsets of the month columns inside a row slice that starts at column E
+            month_offsets = [(period, col, col - 5) for period, col in self.month_col_map.items()]
+            max_col = max(self.month_col_map.values(), default=5)
+            rows = self.ws.iter_rows(min_row=2, min_col=5, max_col=max_col, values_only=True)
+            grid = []
+            for row, values in enumerate(rows, start=2):
+                cell_value = values[0] if values else None  # Column E
+
+                # Stop processing if "Accumulated Total" is reached
+                if cell_value and str(cell_value).strip().lower() == "accumulated total":
+                    logger.info(f"Reached 'Accumulated Total' at row {row}. Stopping iteration.")
+                    break
+                grid.append(values)
+
+            # Operation sections and employee rows, reused from the layout cache where column E is unchanged
+            sections, rebuilt = self.layout_cache.sections(
+                self.layout_key, [values[0] if values else None for values in grid], self._layout_context(),
+                self._is_operation, self._employee_of)
+            record['sections'] = len(sections)
+            record['rebuilt'] = rebuilt
+
+            for row, operation, employee in section_entries(sections):
+                values = grid[row - 2]
+                for period, col, offset in month_offsets:
+                    before_val = values[offset] if offset < len(values) else None
+                    # Set Fees_before to -1 if missing
+                    if before_val is None or (isinstance(before_val, float) and pd.isna(before_val)):
+                        before_val = -1
+
+                    # Store BEFORE update. After update will be filled in next step.
+                    self.cell_audit_log.append(operation, employee, period, row, col, before_val)
+            # Done mapping! self.cell_audit_log = full before-state
+            self._report_name_suggestions(set(self.processed_df['Name_norm'].dropna()), "processed data")
+            self._report_name_suggestions(self.cell_audit_log.employees(), "the target sheet")
+            record['rows'] = len(self.cell_audit_log)
+
+    def _build_fee_index(self):
+        """Index processed fees by (Operation_norm, Name_norm, Month); see build_fee_index."""
+        if self.fee_index is not None:
+            fee_index, self.duplicate_keys = self.fee_index
+        else:
+            fee_index, self.duplicate_keys = build_fee_index(self.processed_df)
+        return fee_index
 
     def update_costs(self):
+        with span('update_costs') as record:
+            update_count = 0
+            unchanged_count = 0
+            fee_index = self._build_fee_index()
+            self.patches = {}
+            self.unmatched_keys = []
+            self.changed_operations = set()
+            self.restored = []
+            changed = None
+            removed_keys = set()
+            restore = []
+            log = self.cell_audit_log
+            # Materialized only when the incremental diff needs a second pass
+            keys = list(log.keys()) if self.incremental else log.keys()
+            if self.incremental:
+                matched = [key for key in keys if key in fee_index]
+                hashes = fee_hashes(matched, (fee_index[key] for key in matched))
+            if self.from_previous:
+                changed, removed = self.state.diff(self.state_section, hashes)
+                changed = {split_key(key) for key in changed}
+                removed_keys = {split_key(key) for key in removed}
+                self.changed_operations.update(key[0] for key in removed_keys)
+                logger.info(f"Incremental run: {len(changed)} new or changed and {len(removed)} removed cells")
+            for i, key in enumerate(keys):
+                # Find the correct fee in the processed DataFrame
+                if key in fee_index:
+                    fee = fee_index[key]
+                    if changed is None or key in changed:
+                        self.changed_operations.add(key[0])
+                        if not self.rewrite_unchanged and fee == log.fees_before[i]:
+                            unchanged_count += 1
+                        else:
+                            self.patches[log.cell(i)] = fee
+                            update_count += 1
+                    # Record the after value
+                    log.set_after(i, fee if fee is not None and not pd.isna(fee) else -1)
+                else:
+                    # No match in processed data: Fees_after should be -1 to indicate missing
+                    log.set_after(i, -1)
+                    self.unmatched_keys.append(key)
+                    if key in removed_keys:
+                        restore.append(i)
+            if restore:
+                # The previous output still holds the fee of a key that is gone; a full run would
+                # leave that cell as the target workbook has it
+                self.restored = [log.cell(i) for i in restore]
+                logger.info(f"Restoring {len(self.restored)} cells of removed keys as {self.target_path} has them")
+            record['rows'] = update_count + len(self.restored)
+            record['cells'] = len(self.cell_audit_log)
+
+        if self.duplicate_keys:
+            logger.info(f"Found {len(self.duplicate_keys)} duplicate (Operation, Employee, Month) keys in processed data; using the first fee for each:")
+            for key, count in self.duplicate_keys.items():
+                logger.info(f"  - {key}: {count} rows")
+        if self.unmatched_keys:
+            logger.info(f"{len(self.unmatched_keys)} target cells had no match in processed data:")
+            for key in self.unmatched_keys:
+                logger.info(f"  - {key}")
+        logger.info(f"Updated {update_count} cells with new costs (highlighted in orange).")
+        if unchanged_count:
+            logger.info(f"Left {unchanged_count} cells that already held their fee untouched.")
+        if update_count or self.restored or not self.from_previous:
+            with span('save', output=self.output_path, writer=self.writer) as record:
+                self._write_output(self.patches, self.restored)
+                record['rows'] = update_count + len(self.restored)
+        if self.incremental:
+            self.state.update(self.state_section, hashes)
+            self.state.update(self.fingerprint_section, {'sha256': self.target_sha256})
+            self.state.save()
+        if self.history is not None:
+            with span('write', output=self.history.path) as record:
+                self.history_run_id = self.history.start_run(
+                    'update', source=f"{os.path.abspath(self.target_path)}:{self.target_sheet}")
+                record['rows'] = self.history.add_audit(self.history_run_id, self.audit_frame(),
+                                                        os.path.basename(self.target_path), self.target_sheet)
+            logger.info(f"Recorded cell audit log as run {self.history_run_id} in {self.history.path}")
+
+    def _restore_cells(self, addresses):
+        """Copy cells (value or formula, and style) from the sheet of target_path into self.ws."""
+        # Not data_only: formulas come back as formulas, not as their cached values
+        wb = load_workbook(self.target_path)
+        try:
+            original_ws = wb[self.target_sheet]
+            for address in addresses:
+                original, cell = original_ws[address], self.ws[address]
+                cell.value = original.value
+                cell.font = copy(original.font)
+                cell.fill = copy(original.fill)
+                cell.border = copy(original.border)
+                cell.alignment = copy(original.alignment)
+                cell.protection = copy(original.protection)
+                cell.number_format = original.number_format
+        finally:
+            wb.close()
+
+    def _write_output(self, patches, restored=()):
+        """Write the updated cells (highlighted in orange) to self.output_path.
+
+        :param restored: addresses of cells to put back as target_path has them, not highlighted
+        """
+        if self.writer == 'patch':
+            try:
+                if restored:
+                    originals = XlsxPatcher(self.target_path, self.target_sheet).original_cells(restored)
+                    patches = {**patches, **originals}
+                XlsxPatcher(self.workbook_path, self.target_sheet).write(self.output_path, patches)
+                return
+            except ValueError as e:
+                logger.warning(f"Cell patch writer not usable for {self.workbook_path} ({e}); saving with openpyxl")
         orange_font = Font(color="FFA500")
-        update_count = 0
-        for entry in self.cell_audit_log:
-            # Find the correct fee in the processed DataFrame
-            mask = (
-                (self.processed_df['Operation_norm'] == entry['Operation']) &
-                (self.processed_df['Name_norm'] == entry['Employee']) &
-                (self.processed_df['Month'] == entry['Month'])
-            )
-            match = self.processed_df[mask]
-            if not match.empty:
-                fee = match['Fees'].values[0]
-                cell = self.ws[entry['Cell']]
-                prev_val = cell.value
-                cell.value = fee
-                cell.font = orange_font
-                update_count += 1
-                # Record the after value
-                entry['Fees_after'] = fee if fee is not None and not (isinstance(fee, float) and pd.isna(fee)) else -1
-            else:
-                # No match in processed data: Fees_after should be -1 to indicate missing
-                entry['Fees_after'] = -1
-        print(f"Updated {update_count} cells with new costs (highlighted in orange).")
-        self.wb.save(self.target_path.replace('.xlsx', '_updated.xlsx'))
-
-    def save_audit_chunks(self, output_dir="../chunks/target_chunks"):
-        """Save audit log as chunks (by operation/project) with before/after fees."""
-        all_df = pd.DataFrame(self.cell_audit_log)
-        os.makedirs(output_dir, exist_ok=True)
-        for op, chunk in all_df.groupby('Operation'):
+        self._load_writable_workbook()
+        for address, fee in patches.items():
+            cell = self.ws[address]
+            cell.value = fee
+            cell.font = orange_font
+        if restored:
+            self._restore_cells(restored)
+        self.wb.save(self.output_path)
+
+    def audit_frame(self):
+        """The audit log as a DataFrame, in the layout of the saved audit chunks."""
+        return self.cell_audit_log.to_frame(dropna=True)
+
+    def save_audit_chunks(self, output_dir="../chunks/target_chunks", fmt='xlsx', max_workers=None):
+        """Save audit log as chunks (by operation/project) with before/after fees.
+
+        Incremental runs only rewrite the chunks of operations with changed cells.
+        """
+        with span('save', output=output_dir, format=fmt) as record:
+            all_df = self.cell_audit_log.to_frame()
+            operations = self.changed_operations if self.from_previous else None
             # Remove rows with NaN in Fees_before or Fees_after before saving
-            chunk_clean = chunk.dropna(subset=['Fees_before', 'Fees_after'])
-            safe_op = op.replace(' ', '_').replace('/', '_')
-            path = os.path.join(output_dir, f"[audit]_{safe_op}.xlsx")
-            chunk_clean.to_excel(path, index=False)
-            print(f"Saved audit chunk: {path}")
+            chunks = [(op, chunk.dropna(subset=['Fees_before', 'Fees_after']))
+                      for op, chunk in all_df.groupby('Operation', observed=True)
+                      if operations is None or op in operations]
+            vanished = set(operations or ()) - {op for op, _ in chunks}
+            records = ChunkWriter(output_dir, fmt, max_workers).write(
+                chunks, "[audit]", merge_manifest=operations is not None, drop_operations=vanished)
+            record['rows'] = sum(r['rows'] for r in records)
+            record['chunks'] = len(records)
+        for record in records:
+            logger.info(f"Saved audit chunk: {os.path.join(output_dir, record['file'])}")
+        return records
 
 
-if __name__ == "__main__":
+def main(argv=None):
     import sys
+    from cli import flag, history_option
+    from instrumentation import configure, cli_options, profiled, write_report
+
+    argv = sys.argv if argv is None else argv
+    options = cli_options(argv)
+    configure(trace_memory=options['trace_memory'])
     # Get absolute paths relative to this script's directory
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     TARGET_FILE = os.path.abspath(os.path.join(BASE_DIR, "../docs/target_sheet.xlsx"))
@@ -139,11 +374,27 @@ if __name__ == "__main__":
     SHEET_NAME = "Project"
 
     # Print working directory and resolved paths for debug purposes
-    print(f"Current working directory: {os.getcwd()}")
-    print(f"Resolved TARGET_FILE: {TARGET_FILE}")
-    print(f"Resolved PROCESSED_FILE: {PROCESSED_FILE}")
-
-    mapper = EmployeeCostMapper(TARGET_FILE, PROCESSED_FILE, SHEET_NAME, SKIP_NAMES)
-    mapper.map_employees()
-    mapper.update_costs()
-    mapper.save_audit_chunks()
\ No newline at end of file
+    logger.info(f"Current working directory: {os.getcwd()}")
+    logger.info(f"Resolved TARGET_FILE: {TARGET_FILE}")
+    logger.info(f"Resolved PROCESSED_FILE: {PROCESSED_FILE}")
+
+    history = history_option(argv)
+
+    with profiled(options['profile'], options['profile_path']):
+        mapper = EmployeeCostMapper(TARGET_FILE, PROCESSED_FILE, SHEET_NAME, SKIP_NAMES,
+                                    read_only='--read-only' in argv,
+                                    use_cache='--no-cache' not in argv,
+                                    incremental='--incremental' in argv,
+                                    writer='openpyxl' if '--openpyxl-writer' in argv else 'patch',
+                                    history=history,
+                                    rewrite_unchanged='--rewrite-all' in argv)
+        mapper.map_employees()
+        mapper.update_costs()
+        chunk_format = flag(argv, 'chunk-format', 'xlsx')
+        mapper.save_audit_chunks(fmt=chunk_format)
+    if options['metrics_path']:
+        write_report(options['metrics_path'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# watcher.py
+import os
+import time
+import zipfile
+
+from dataProcessor import TimeSheetUpdater
+from updater import EmployeeCostMapper
+from name_mappings import SKIP_NAMES, get_name_index
+from instrumentation import logger, span
+
+
+def file_signature(path):
+    """(mtime_ns, size) of path, or None while it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def is_complete_xlsx(path):
+    """True once path is a readable zip, i.e. not a workbook still being copied in."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            return zf.testzip() is None
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+class WatchDaemon:
+    """Re-run the pipeline stages whenever the source or target workbook changes.
+
+    The processed frame, the parsed target sheet (workbook, month_col_map and the
+    mapped row grid in the audit log) and the name index stay in memory between
+    runs, so a new source timesheet only costs the process stage plus the fee
+    lookup, and only a changed target sheet is parsed again.
+
+    Files are polled; a change is acted on once the file has stayed the same for
+    debounce seconds and is a complete workbook, so bursts of writes (or a copy in
+    progress) trigger one run.
+    """
+
+    def __init__(self, source_path, target_path, target_sheet='Project', processed_path=None,
+                 interval=1.0, debounce=2.0, save_chunks=False, chunk_format='xlsx', history=None):
+        """
+        :param processed_path: also write the processed workbook here after each run
+        :param interval: seconds between polls
+        :param debounce: seconds a changed file must stay unchanged before it is used
+        :param save_chunks: write processed and audit chunks like the standalone scripts
+        :param history: HistoryStore to record every run in
+        """
+        self.source_path = source_path
+        self.target_path = target_path
+        self.target_sheet = target_sheet
+        self.processed_path = processed_path
+        self.interval = interval
+        self.debounce = debounce
+        self.save_chunks = save_chunks
+        self.chunk_format = chunk_format
+        self.history = history
+        self.updater = TimeSheetUpdater()
+        self.processed_df = None
+        self.mapper = None
+        self._seen = {}  # path -> signature the warm state was built from
+        self._pending = {}  # path -> (signature, first seen unchanged at)
+        get_name_index()  # Build the fuzzy name index up front
+
+    def _changed(self, path):
+        """Return True once a change to path has settled (debounced)."""
+        signature = file_signature(path)
+        if signature is None or signature == self._seen.get(path):
+            self._pending.pop(path, None)
+            return False
+        now = time.monotonic()
+        pending = self._pending.get(path)
+        if pending is None or pending[0] != signature:
+            self._pending[path] = (signature, now)
+            return False
+        if now - pending[1] < self.debounce or not is_complete_xlsx(path):
+            return False
+        self._seen[path] = signature
+        del self._pending[path]
+        return True
+
+    def run_process_stage(self):
+        self.updater.load_and_process_data(self.source_path, chunk_format=self.chunk_format,
+                                           save_chunks=self.save_chunks, history=self.history)
+        self.processed_df = self.updater.process_all_chunks()
+        if self.processed_path:
+            self.updater.save_processed_data(self.processed_df, self.processed_path)
+
+    def run_update_stage(self, target_changed):
+        """Fee lookup and write; the target sheet is only re-parsed when it changed."""
+        remap = target_changed or self.mapper is None
+        if remap:
+            # The patch writer leaves the loaded workbook untouched, so it stays valid as the before-state
+            self.mapper = EmployeeCostMapper(self.target_path, None, self.target_sheet, SKIP_NAMES,
+                                             processed_df=self.processed_df, writer='patch',
+                                             history=self.history)
+        elif self.mapper.set_processed(self.processed_df):
+            remap = True  # new operations delimit the sheet's sections differently
+        if remap:
+            self.mapper.map_employees()
+        self.mapper.update_costs()
+        if self.save_chunks:
+            self.mapper.save_audit_chunks(fmt=self.chunk_format)
+
+    def poll(self):
+        """Check both files once and run the affected stages; returns the stages run."""
+        source_changed = self._changed(self.source_path)
+        target_changed = self._changed(self.target_path)
+        stages = []
+        if not (source_changed or target_changed):
+            return stages
+        with span('watch_run', source_changed=source_changed, target_changed=target_changed) as record:
+            if source_changed or self.processed_df is None:
+                self.run_process_stage()
+                stages.append('process')
+            self.run_update_stage(target_changed)
+            stages.append('update')
+            record['stages'] = stages
+        logger.info(f"Watch run finished ({', '.join(stages)}) in {record['wall_s']:.2f}s")
+        return stages
+
+    def prime(self):
+        """Build the warm state from the current files without waiting for a change."""
+        self._seen[self.source_path] = file_signature(self.source_path)
+        self._seen[self.target_path] = file_signature(self.target_path)
+        self.run_process_stage()
+        self.run_update_stage(target_changed=True)
+
+    def serve_forever(self, max_polls=None):
+        """Poll until interrupted (or for max_polls polls)."""
+        logger.info(f"Watching {self.source_path} and {self.target_path} "
+                    f"(every {self.interval}s, debounce {self.debounce}s)")
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                try:
+                    self.poll()
+                except Exception as e:
+                    # Keep watching; the next change to the files gets a fresh attempt
+                    logger.error(f"Watch run failed: {type(e).__name__}: {e}")
+                polls += 1
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching.")
+
+
+def main(argv=None):
+    # Usage: python watcher.py [--source=<xlsx>] [--target=<xlsx>] [--sheet=Project] [--interval=1]
+    #        [--debounce=2] [--write-intermediates] [--chunk-format=xlsx] [--history[=<db>]] [--no-prime]
+    import sys
+    from cli import flag, history_option
+    from instrumentation import configure, cli_options
+
+    argv = sys.argv if argv is None else argv
+    options = cli_options(argv)
+    configure(trace_memory=options['trace_memory'])
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    history = history_option(argv)
+    write_intermediates = '--write-intermediates' in argv
+    daemon = WatchDaemon(
+        flag(argv, 'source', os.path.abspath(os.path.join(BASE_DIR, "../docs/source_timesheet.xlsx"))),
+        flag(argv, 'target', os.path.abspath(os.path.join(BASE_DIR, "../docs/target_sheet.xlsx"))),
+        flag(argv, 'sheet', "Project"),
+        processed_path=(os.path.abspath(os.path.join(BASE_DIR, "../docs/processed_timesheet.xlsx"))
+                        if write_intermediates else None),
+        interval=float(flag(argv, 'interval', 1.0)),
+        debounce=float(flag(argv, 'debounce', 2.0)),
+        save_chunks=write_intermediates,
+        chunk_format=flag(argv, 'chunk-format', 'xlsx'),
+        history=history,
+    )
+    if '--no-prime' not in argv:
+        daemon.prime()
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# work_packages.py
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import logger
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_PATH = os.path.abspath(os.path.join(BASE_DIR, "../config/work_packages.json"))
+
+_CODE_RE = re.compile(r'^\s*(\d+)\s*(?:/|-|$)')
+
+
+def normalize_package(label):
+    """Case- and spacing-insensitive form of a work package label.
+
+    '001 / Avature Crew  - PM/CM' and '001/Avature Crew - PM/CM' both become
+    '001 / avature crew - pm/cm'.
+    """
+    text = " ".join(str(label).split()).casefold()
+    # One space around the code separator and the ' / ' and ' - ' separators,
+    # none inside tokens like 'PM/CM' or 'Pre-/Onboarding'
+    text = re.sub(r'^(\d+)\s*/\s*', r'\1 / ', text)
+    text = re.sub(r'\s*/\s+|\s+/\s*', ' / ', text)
+    return re.sub(r'\s+-\s*|\s*-\s+', ' - ', text)
+
+
+def package_code(label):
+    """Leading numeric package code as an int ('052 / ...' -> 52), or None."""
+    match = _CODE_RE.match(str(label))
+    return int(match.group(1)) if match else None
+
+
+class WorkPackageClassifier:
+    """Map work package labels to operations.
+
+    A label matches a configured package by its normalized text, or else by its
+    leading numeric code (from the configured packages or the explicit code table).
+    Results are cached per distinct label.
+    """
+
+    def __init__(self, packages, codes=None, config_path=None):
+        """
+        :param packages: work package label -> operation
+        :param codes: package code (e.g. '057' or 57) -> operation, for packages
+            matched by number only; these win over codes derived from packages
+        :param config_path: JSON file the mapping was loaded from, if any
+        """
+        self.packages = dict(packages)
+        self.config_path = config_path
+        self._by_text = {normalize_package(label): op for label, op in self.packages.items()}
+        derived = {}
+        for label, op in self.packages.items():
+            code = package_code(label)
+            if code is not None:
+                derived.setdefault(code, set()).add(op)
+        # A code shared by packages of different operations says nothing; leave it out
+        self._by_code = {code: ops.pop() for code, ops in derived.items() if len(ops) == 1}
+        for code, ops in derived.items():
+            if len(ops) > 1:
+                logger.warning(f"Work package code {code:03d} maps to several operations {sorted(ops)}; "
+                               "matching on its text only")
+        self._by_code.update({int(code): op for code, op in (codes or {}).items()})
+        self._cache = {}
+
+    @classmethod
+    def from_config(cls, path=DEFAULT_CONFIG_PATH):
+        """Load {'packages': {label: operation}, 'codes': {code: operation}} from a JSON file."""
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config.get('packages', {}), config.get('codes', {}), config_path=path)
+
+    def classify(self, label):
+        """Operation for one work package label, or None if it is not mapped."""
+        try:
+            return self._cache[label]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable cell value
+            return None
+        operation = None
+        if label is not None and not (isinstance(label, float) and np.isnan(label)):
+            operation = self._by_text.get(normalize_package(label))
+            if operation is None:
+                operation = self._by_code.get(package_code(label))
+        self._cache[label] = operation
+        return operation
+
+    def classify_series(self, labels):
+        """Vectorized classify: each distinct label is resolved once and broadcast back."""
+        codes, uniques = pd.factorize(labels)
+        operations = np.array([self.classify(label) for label in uniques] + [None], dtype=object)
+        # Missing labels have code -1, which picks the trailing None
+        return pd.Series(operations[codes], index=labels.index, name='Operation')
+
+    def unmapped_report(self, labels, fees):
+        """Rows and fee totals per unmapped work package, largest fee total first."""
+        operations = self.classify_series(labels)
+        unmapped = pd.DataFrame({'Work Package': labels, 'Fees': fees})[operations.isna().to_numpy()]
+        report = unmapped.groupby('Work Package', dropna=False).agg(Rows=('Fees', 'size'), Fees=('Fees', 'sum'))
+        return report.sort_values('Fees', ascending=False).reset_index()
+
+
+def load_classifier(path=None):
+    """Classifier from path, or from DEFAULT_CONFIG_PATH."""
+    return WorkPackageClassifier.from_config(path or DEFAULT_CONFIG_PATH)
+
+
+def log_unmapped_report(report, config_path=None):
+    """Log unmapped_report; config_path is the mapping file to add the packages to (None: set in code)."""
+    if report.empty:
+        return
+    where = os.path.relpath(config_path) if config_path else "the work package mapping"
+    logger.info(f"{len(report)} work packages have no operation mapping (add them to {where}):")
+    for row in report.itertuples(index=False):
+        logger.info(f"  - '{row[0]}': {row.Rows} rows, fees {row.Fees:.2f}")
@@ -0,0 +1,345 @@
+# xlsx_patch.py
+import datetime
+import math
+import numbers
+import posixpath
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+from openpyxl.formula.translate import Translator
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, to_excel
+
+from file_utils import atomic_path
+
+ORANGE_RGB = "FFFFA500"
+
+_ROW_RE = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b[^>]*?\br="([A-Z]+)(\d+)"[^>]*?(?:/>|>.*?</c>)', re.S)
+_STYLE_ATTR_RE = re.compile(r'\bs="(\d+)"')
+_CELL_REF_RE = re.compile(r'^([A-Z]+)(\d+)$')
+_SHARED_MASTER_RE = re.compile(r'<f\b([^>]*\bt="shared"[^>]*)>([^<]*)</f>')
+_SHARED_CHILD_RE = re.compile(r'<f\b[^>]*\bt="shared"[^>]*/>')
+_SI_ATTR_RE = re.compile(r'\bsi="(\d+)"')
+_SHARED_STRING_RE = re.compile(r'<si>(.*?)</si>|<si/>', re.S)
+# Style records cells point at by index (directly or through an xf)
+_STYLE_BLOCKS = ("numFmts", "fonts", "fills", "borders", "cellStyleXfs", "cellXfs")
+
+
+class OriginalCell:
+    """Patch value that puts a cell back as another copy of the workbook holds it.
+
+    Made by XlsxPatcher.original_cells; the cell is written as is (formula, cached
+    value and style) and is not highlighted.
+    """
+
+    def __init__(self, xml, styles_xml):
+        """
+        :param xml: the <c> element, with shared strings and shared formulas written out
+        :param styles_xml: styles.xml of the workbook the cell was read from
+        """
+        self.xml = xml
+        self.styles_xml = styles_xml
+
+
+def _styles_extend(base_xml, styles_xml):
+    """True if every style record of base_xml keeps its index in styles_xml (records were only appended)."""
+    for tag in _STYLE_BLOCKS:
+        base = re.search(rf'<{tag}\b[^>]*>(.*?)</{tag}>', base_xml, re.S)
+        if base is None:
+            continue
+        block = re.search(rf'<{tag}\b[^>]*>(.*?)</{tag}>', styles_xml, re.S)
+        if block is None or not block.group(1).startswith(base.group(1)):
+            return False
+    return True
+
+
+class XlsxPatcher:
+    """Write cell values into one sheet of an xlsx file by editing its XML in place.
+
+    Only the <c> elements being written (and their <row> when one is missing) are
+    touched; every other zip member and every other cell, including formulas, is
+    copied byte-for-byte. Written cells get an orange font through one extra cell
+    style per original style (usually just one for a block of fee cells).
+    """
+
+    def __init__(self, path, sheet_name):
+        self.path = path
+        self.sheet_name = sheet_name
+        with zipfile.ZipFile(path) as zf:
+            self.sheet_part = self._find_sheet_part(zf)
+            workbook = zf.read("xl/workbook.xml").decode("utf-8")
+        # Dates are stored as serial numbers counted from the workbook's epoch
+        date1904 = re.search(r'\bdate1904="(1|true)"', workbook)
+        self.epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+    def _find_sheet_part(self, zf):
+        workbook = zf.read("xl/workbook.xml").decode("utf-8")
+        rels = zf.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+        for sheet in re.finditer(r'<sheet\b[^>]*/>', workbook):
+            tag = sheet.group(0)
+            name = re.search(r'\bname="([^"]*)"', tag)
+            rid = re.search(r'\br:id="([^"]*)"', tag) or re.search(r'\bid="([^"]*)"', tag)
+            if name and rid and name.group(1) == escape(self.sheet_name, {'"': "&quot;"}):
+                for rel in re.finditer(r'<Relationship\b[^>]*/>', rels):
+                    if re.search(rf'\bId="{re.escape(rid.group(1))}"', rel.group(0)):
+                        target = re.search(r'\bTarget="([^"]*)"', rel.group(0)).group(1)
+                        if target.startswith("/"):
+                            return target.lstrip("/")
+                        return posixpath.normpath(posixpath.join("xl", target))
+        raise ValueError(f"Sheet '{self.sheet_name}' not found in {self.path}")
+
+    def _cell_xml(self, ref, value, style):
+        """XML of one cell; ValueError for values this writer cannot store (the caller falls back to openpyxl)."""
+        style_attr = f' s="{style}"' if style is not None else ""
+        if hasattr(value, "item"):  # NumPy scalar -> Python scalar
+            value = value.item()
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return f'<c r="{ref}"{style_attr}/>'
+        if isinstance(value, str):
+            return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+        if isinstance(value, bool):
+            return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return f'<c r="{ref}"{style_attr}><v>{to_excel(value, self.epoch)!r}</v></c>'
+        if isinstance(value, numbers.Real) and math.isfinite(value):
+            return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+        raise ValueError(f"Cannot write {type(value).__name__} value {value!r} to cell {ref}")
+
+    def _patch_row(self, row_xml, cells, style_for):
+        """Replace or insert the cells of one row; cells maps column index -> (ref, value)."""
+        removed_formula = False
+
+        def render(ref, value, style):
+            nonlocal removed_formula
+            if isinstance(value, OriginalCell):
+                removed_formula = removed_formula or "<f" in value.xml
+                return value.xml
+            return self._cell_xml(ref, value, style_for(style))
+
+        pending = dict(cells)
+        pieces = []
+        pos = 0
+        body_start = row_xml.index(">") + 1
+        if row_xml[body_start - 2] == "/":  # empty self-closing <row .../>
+            head = row_xml[:body_start - 2] + ">"
+            body, tail = "", "</row>"
+        else:
+            head = row_xml[:body_start]
+            body, tail = row_xml[body_start:-len("</row>")], "</row>"
+        for match in _CELL_RE.finditer(body):
+            col = column_index_from_string(match.group(1))
+            # Insert new cells that sort before this one
+            for new_col in sorted(c for c in pending if c < col):
+                ref, value = pending.pop(new_col)
+                pieces.append(body[pos:match.start()])
+                pieces.append(render(ref, value, None))
+                pos = match.start()
+            if col in pending:
+                ref, value = pending.pop(col)
+                old = match.group(0)
+                removed_formula = removed_formula or "<f" in old
+                style = _STYLE_ATTR_RE.search(old[:old.index(">")])
+                pieces.append(body[pos:match.start()])
+                pieces.append(render(ref, value, int(style.group(1)) if style else None))
+                pos = match.end()
+        pieces.append(body[pos:])
+        for new_col in sorted(pending):
+            ref, value = pending[new_col]
+            pieces.append(render(ref, value, None))
+        return head + "".join(pieces) + tail, removed_formula
+
+    @staticmethod
+    def _shared_masters(sheet_xml, refs=None):
+        """si -> (master ref, formula) of the shared formula groups, only those whose master is in refs if given."""
+        masters = {}
+        if 't="shared"' not in sheet_xml:
+            return masters
+        for match in _CELL_RE.finditer(sheet_xml):
+            ref = match.group(1) + match.group(2)
+            if (refs is not None and ref not in refs) or "<f" not in match.group(0):
+                continue
+            shared = _SHARED_MASTER_RE.search(match.group(0))
+            if shared and 'ref="' in shared.group(1):
+                masters[_SI_ATTR_RE.search(shared.group(1)).group(1)] = (ref, unescape(shared.group(2)))
+        return masters
+
+    @staticmethod
+    def _expand_shared(cell, masters):
+        """XML of cell (a _CELL_RE match) with a shared formula of a group in masters written out in full."""
+        xml = cell.group(0)
+        child = _SHARED_CHILD_RE.search(xml)
+        si = _SI_ATTR_RE.search(child.group(0)) if child else None
+        if not si or si.group(1) not in masters:
+            return xml
+        origin, formula = masters[si.group(1)]
+        translated = Translator(f"={formula}", origin=origin).translate_formula(cell.group(1) + cell.group(2))
+        return xml[:child.start()] + f"<f>{escape(translated[1:])}</f>" + xml[child.end():]
+
+    def _unshare_formulas(self, sheet_xml, patches):
+        """Expand the shared formulas whose master cell is about to be overwritten.
+
+        The other cells of such a group only hold <f t="shared" si=".."/> and take their
+        formula from the master, so each of them gets the master's formula translated
+        to its own position before the master is replaced.
+        """
+        masters = self._shared_masters(sheet_xml, patches)
+        if not masters:
+            return sheet_xml
+        return _CELL_RE.sub(lambda cell: self._expand_shared(cell, masters), sheet_xml)
+
+    def original_cells(self, refs):
+        """The cells refs of this sheet as OriginalCell patch values, for writing into a copy of this workbook.
+
+        Shared strings become inline strings and shared formulas plain formulas, so
+        the cells do not depend on the string table or formula groups of the copy.
+        A cell missing from the sheet comes back as an empty cell.
+        """
+        refs = set(refs)
+        with zipfile.ZipFile(self.path) as zf:
+            sheet_xml = zf.read(self.sheet_part).decode("utf-8")
+            styles_xml = zf.read("xl/styles.xml").decode("utf-8")
+            names = zf.namelist()
+            strings_xml = zf.read("xl/sharedStrings.xml").decode("utf-8") if "xl/sharedStrings.xml" in names else ""
+        strings = [match.group(1) or "" for match in _SHARED_STRING_RE.finditer(strings_xml)]
+        masters = self._shared_masters(sheet_xml)
+        cells = {ref: OriginalCell(f'<c r="{ref}"/>', styles_xml) for ref in refs}
+        for cell in _CELL_RE.finditer(sheet_xml):
+            ref = cell.group(1) + cell.group(2)
+            if ref not in refs:
+                continue
+            xml = self._expand_shared(cell, masters)
+            # The master of a group keeps its formula; only the group attributes go
+            xml = _SHARED_MASTER_RE.sub(lambda f: f"<f>{f.group(2)}</f>", xml)
+            open_tag = xml[:xml.index(">") + 1]
+            if re.search(r'\bt="s"', open_tag):
+                index = int(re.search(r'<v>(\d+)</v>', xml).group(1))
+                open_tag = re.sub(r'\bt="s"', 't="inlineStr"', open_tag)
+                xml = f"{open_tag}<is>{strings[index]}</is></c>"
+            cells[ref] = OriginalCell(xml, styles_xml)
+        return cells
+
+    def _patch_sheet(self, sheet_xml, patches, style_for):
+        sheet_xml = self._unshare_formulas(sheet_xml, patches)
+        by_row = {}
+        for ref, value in patches.items():
+            col_letters, row = _CELL_REF_RE.match(ref).groups()
+            by_row.setdefault(int(row), {})[column_index_from_string(col_letters)] = (ref, value)
+
+        data_start = sheet_xml.find("<sheetData")
+        if data_start < 0:
+            raise ValueError("Unsupported sheet XML: no <sheetData> element")
+        open_end = sheet_xml.index(">", data_start) + 1
+        if sheet_xml[open_end - 2] == "/":  # <sheetData/>
+            prefix, data, suffix = sheet_xml[:data_start] + "<sheetData>", "", "</sheetData>" + sheet_xml[open_end:]
+        else:
+            close = sheet_xml.index("</sheetData>", open_end)
+            prefix, data, suffix = sheet_xml[:open_end], sheet_xml[open_end:close], sheet_xml[close:]
+
+        removed_formula = False
+        pieces = []
+        pos = 0
+        for match in _ROW_RE.finditer(data):
+            row_num = int(match.group(1))
+            for new_row in sorted(r for r in by_row if r < row_num):
+                pieces.append(data[pos:match.start()])
+                patched, _ = self._patch_row(f'<row r="{new_row}">', by_row.pop(new_row), style_for)
+                pieces.append(patched)
+                pos = match.start()
+            if row_num in by_row:
+                pieces.append(data[pos:match.start()])
+                patched, had_formula = self._patch_row(match.group(0), by_row.pop(row_num), style_for)
+                removed_formula = removed_formula or had_formula
+                pieces.append(patched)
+                pos = match.end()
+        pieces.append(data[pos:])
+        for new_row in sorted(by_row):
+            patched, _ = self._patch_row(f'<row r="{new_row}">', by_row[new_row], style_for)
+            pieces.append(patched)
+        return prefix + "".join(pieces) + suffix, removed_formula
+
+    @staticmethod
+    def _style_factory(styles_xml):
+        """Return (style_for, finish): style_for maps an original xf index to its orange twin."""
+        fonts_match = re.search(r'<fonts\b[^>]*>(.*?)</fonts>', styles_xml, re.S)
+        xfs_match = re.search(r'<cellXfs\b[^>]*>(.*?)</cellXfs>', styles_xml, re.S)
+        if not fonts_match or not xfs_match:
+            raise ValueError("Unsupported styles.xml: missing <fonts> or <cellXfs>")
+        font_count = len(re.findall(r'<font\b', fonts_match.group(1)))
+        xfs = re.findall(r'<xf\b[^>]*?(?:/>|>.*?</xf>)', xfs_match.group(1), re.S)
+        orange_font_id = font_count
+        new_xfs = []
+        derived = {}
+
+        def style_for(original):
+            original = original or 0
+            if original not in derived:
+                base = xfs[original] if original < len(xfs) else '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+                if base.endswith("/>"):
+                    head, rest = base[:-2].rstrip(), "/>"
+                else:
+                    head, rest = base[:base.index(">")], base[base.index(">"):]
+                head = re.sub(r'\s(fontId|applyFont)="[^"]*"', "", head)
+                new_xfs.append(f'{head} fontId="{orange_font_id}" applyFont="1"{rest}')
+                derived[original] = len(xfs) + len(new_xfs) - 1
+            return derived[original]
+
+        def finish():
+            if not new_xfs:
+                return styles_xml
+            out = styles_xml
+            out = out.replace(fonts_match.group(0), re.sub(
+                r'<fonts\b[^>]*>', f'<fonts count="{font_count + 1}">', fonts_match.group(0), count=1
+            ).replace("</fonts>", f'<font><color rgb="{ORANGE_RGB}"/></font></fonts>'), 1)
+            xfs_block = re.search(r'<cellXfs\b[^>]*>.*?</cellXfs>', out, re.S).group(0)
+            out = out.replace(xfs_block, re.sub(
+                r'<cellXfs\b[^>]*>', f'<cellXfs count="{len(xfs) + len(new_xfs)}">', xfs_block, count=1
+            ).replace("</cellXfs>", "".join(new_xfs) + "</cellXfs>"), 1)
+            return out
+
+        return style_for, finish
+
+    def write(self, output_path, patches):
+        """Write patches ({'F12': 123, ...}) into the sheet and save the result to output_path.
+
+        Values may be OriginalCell objects from original_cells of the workbook this one
+        was made from; a ValueError is raised if its styles were rewritten since.
+        """
+        with zipfile.ZipFile(self.path) as src:
+            sheet_xml = src.read(self.sheet_part).decode("utf-8")
+            styles_xml = src.read("xl/styles.xml").decode("utf-8")
+            for base_xml in {value.styles_xml for value in patches.values() if isinstance(value, OriginalCell)}:
+                if not _styles_extend(base_xml, styles_xml):
+                    raise ValueError("the original cells' styles do not carry over to this workbook")
+            style_for, finish_styles = self._style_factory(styles_xml)
+            sheet_xml, removed_formula = self._patch_sheet(sheet_xml, patches, style_for)
+            replaced = {
+                self.sheet_part: sheet_xml.encode("utf-8"),
+                "xl/styles.xml": finish_styles().encode("utf-8"),
+            }
+            workbook_xml = src.read("xl/workbook.xml").decode("utf-8")
+            # Recalculate formulas on open since their inputs changed
+            if "<calcPr" in workbook_xml and "fullCalcOnLoad" not in workbook_xml:
+                replaced["xl/workbook.xml"] = workbook_xml.replace(
+                    "<calcPr", '<calcPr fullCalcOnLoad="1"', 1).encode("utf-8")
+            dropped = set()
+            if removed_formula and "xl/calcChain.xml" in src.namelist():
+                # The calc chain lists formula cells; let Excel rebuild it
+                dropped.add("xl/calcChain.xml")
+                types = src.read("[Content_Types].xml").decode("utf-8")
+                replaced["[Content_Types].xml"] = re.sub(
+                    r'<Override\b[^>]*PartName="/xl/calcChain.xml"[^>]*/>', "", types).encode("utf-8")
+                rels = src.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+                replaced["xl/_rels/workbook.xml.rels"] = re.sub(
+                    r'<Relationship\b[^>]*Target="[^"]*calcChain.xml"[^>]*/>', "", rels).encode("utf-8")
+
+            with atomic_path(output_path) as tmp_path, zipfile.ZipFile(tmp_path, "w") as dst:
+                for info in src.infolist():
+                    if info.filename in dropped:
+                        continue
+                    if info.filename in replaced:
+                        dst.writestr(info, replaced[info.filename], compress_type=zipfile.ZIP_DEFLATED)
+                    else:
+                        # Unchanged content; zipfile recompresses it with the member's original method
+                        dst.writestr(info, src.read(info.filename))
@@ -0,0 +1,81 @@
+# test_data_processor.py
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from dataProcessor import MONTH_ABBR, TimeSheetUpdater  # noqa: E402
+
+SOURCE_ROWS = [
+    # Repeated groups, fractional fees that round both ways, an empty fee
+    ("001 / Avature Crew  - PM/CM", "Alice", "2024-01-15", 10.25),
+    ("003 / Avature Crew  - Testcenter", "Alice", "2024-01-31", 20.25),
+    ("001 / Avature Crew  - PM/CM", "Alice", "2024-02-01", 7.5),
+    ("052 / Avature Crew - Pre-/Onboarding", "Bob", "2024-02-10", 0.1),
+    ("052 / Avature Crew - Pre-/Onboarding", "Bob", "2024-02-11", 0.2),
+    ("052 / Avature Crew - Pre-/Onboarding", "Bob", "2024-02-12", 0.3),
+    ("005 / Eightfold Crew - PM/CM", "Carol", "2023-12-05", None),
+    ("005 / Eightfold Crew - PM/CM", "Carol", "2023-12-06", 99.49),
+    ("007 / Eightfold Crew  - Testcenter", "Alice", "2024-10-01", 1e6 + 0.5),
+    # Unmapped work package: dropped by both paths
+    ("999 / Unknown", "Dave", "2024-01-01", 500.0),
+]
+
+
+def _source(path):
+    frame = pd.DataFrame(SOURCE_ROWS, columns=["Work Package", "Name", "Period", "Fees"])
+    frame["Period"] = pd.to_datetime(frame["Period"])
+    frame.to_excel(path, index=False)
+
+
+def _original_custom_round(value):
+    """custom_round as it was before it went through custom_round_array."""
+    decimal_part = value - int(value)
+    return math.ceil(value) if decimal_part >= 0.5 else math.floor(value)
+
+
+def _original_period_label(date):
+    """format_period's '%b-%y'.title() under de_DE.UTF-8, without depending on the host locale."""
+    return f"{MONTH_ABBR[date.month - 1]}-{date.strftime('%y')}".title()
+
+
+def test_streaming_aggregation_matches_the_frame_path(tmp_path):
+    source = str(tmp_path / "source.xlsx")
+    _source(source)
+
+    frame_updater, stream_updater = TimeSheetUpdater(), TimeSheetUpdater()
+    frame = frame_updater.load_and_process_data(source, use_cache=False, save_chunks=False)
+    streamed = stream_updater.load_and_process_data(source, streaming=True, save_chunks=False)
+
+    pd.testing.assert_frame_equal(streamed, frame)
+    pd.testing.assert_frame_equal(stream_updater.unmapped_packages, frame_updater.unmapped_packages,
+                                  check_dtype=False)
+    assert len(frame) == 5
+
+
+def test_vectorized_rounding_matches_the_scalar_rounding():
+    values = [0.0, 0.49, 0.5, 0.51, 1.5, 2.5, 99.49, 1e6 + 0.5, -0.4, -0.5, -2.5, -2.6, 0.1 + 0.2 + 0.2]
+    updater = TimeSheetUpdater()
+
+    expected = [_original_custom_round(value) for value in values]
+
+    assert updater.custom_round_array(values).tolist() == expected
+    assert [updater.custom_round(value) for value in values] == expected
+
+
+def test_vectorized_period_columns_match_the_scalar_formatting():
+    dates = pd.to_datetime(["2024-10-15", "2024-03-01", "2023-12-31", "2024-10-02", "2024-05-20"])
+    updater = TimeSheetUpdater()
+
+    columns = updater.period_columns(pd.Series(dates).dt.to_period("M"))
+
+    assert columns["Period"].tolist() == [updater.format_period(date) for date in dates]
+    assert columns["Period"].tolist() == [_original_period_label(date) for date in dates]
+    assert columns["Month"].tolist() == [date.strftime("%Y-%m") for date in dates]
+    assert (columns["StartDate"].to_numpy() == dates.to_period("M").to_timestamp().to_numpy()).all()
+    assert updater.format_period("2024-03-09") == "Mär-24"
+    assert np.isnan(updater.format_period(np.nan))
@@ -0,0 +1,37 @@
+# test_file_utils.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from file_utils import atomic_path, evict_lru, write_json  # noqa: E402
+
+
+def test_atomic_path_uses_unique_temp_names_and_cleans_up_on_error(tmp_path):
+    target = str(tmp_path / "state.json")
+    with atomic_path(target) as first, atomic_path(target) as second:
+        assert first != second
+        assert os.path.dirname(first) == str(tmp_path)
+        for tmp in (first, second):
+            with open(tmp, "w") as f:
+                f.write(tmp)
+    assert open(target).read() == first  # the last rename wins
+    with pytest.raises(RuntimeError):
+        with atomic_path(target) as tmp:
+            open(tmp, "w").close()
+            raise RuntimeError
+    assert sorted(os.listdir(tmp_path)) == ["state.json"]
+
+
+def test_evict_lru_removes_oldest_entries_and_skips_temp_files(tmp_path):
+    for n in range(4):
+        path = str(tmp_path / f"{n}.json")
+        write_json(path, {"n": n})
+        os.utime(path, (n, n))
+    open(tmp_path / ".pending.0.json", "w").close()
+
+    evict_lru(str(tmp_path), ".json", max_entries=2, keep=str(tmp_path / "0.json"))
+
+    assert sorted(os.listdir(tmp_path)) == [".pending.0.json", "0.json", "3.json"]
@@ -0,0 +1,101 @@
+# test_incremental_update.py
+import os
+import shutil
+import sys
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from run_state import RunState  # noqa: E402
+from updater import EmployeeCostMapper  # noqa: E402
+
+FIRST_RUN = [
+    ("Op A", "Alice", "2024-01", 100), ("Op A", "Alice", "2024-02", 110),
+    ("Op A", "Bob", "2024-01", 200), ("Op A", "Bob", "2024-02", 210),
+    ("Op B", "Carol", "2024-01", 300),
+]
+# Alice's January fee changes and Bob is gone
+SECOND_RUN = [
+    ("Op A", "Alice", "2024-01", 150), ("Op A", "Alice", "2024-02", 110),
+    ("Op B", "Carol", "2024-01", 300),
+]
+
+
+def _processed(rows):
+    return pd.DataFrame(rows, columns=["Operation", "Name", "Month", "Fees"])
+
+
+def _target(path):
+    """Two operation sections; Bob's January cell holds a bold formula."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Project"
+    ws["F1"], ws["G1"] = "2024-01", "2024-02"
+    for row, name in enumerate(["Op A", "Alice", "Bob", "Op B", "Carol", "Accumulated Total"], start=2):
+        ws.cell(row, 5, name)
+    ws["F3"], ws["G3"] = 0, 0
+    ws["F4"], ws["G4"] = "=1+1", 5
+    ws["F4"].font = Font(bold=True)
+    ws["F6"] = 1
+    wb.save(path)
+
+
+def _run(target_path, rows, state=None):
+    mapper = EmployeeCostMapper(target_path, None, "Project", [], use_cache=False, processed_df=_processed(rows),
+                                incremental=state is not None, state=state)
+    mapper.map_employees()
+    mapper.update_costs()
+    return mapper
+
+
+def _cells(path):
+    """Value (formulas as written) and font of every cell of the output sheet."""
+    ws = load_workbook(path)["Project"]
+    return {cell.coordinate: (cell.value, cell.font.b, cell.font.color.rgb if cell.font.color else None)
+            for row in ws.iter_rows() for cell in row}
+
+
+def _full_and_incremental(tmp_path, edit_target=None):
+    full_dir, incremental_dir = tmp_path / "full", tmp_path / "incremental"
+    full_dir.mkdir()
+    incremental_dir.mkdir()
+    full_target, incremental_target = str(full_dir / "target.xlsx"), str(incremental_dir / "target.xlsx")
+    _target(incremental_target)
+
+    state_path = str(tmp_path / "state.json")
+    _run(incremental_target, FIRST_RUN, RunState(state_path))
+    if edit_target:
+        edit_target(incremental_target)
+    mapper = _run(incremental_target, SECOND_RUN, RunState(state_path))
+    shutil.copy(incremental_target, full_target)
+    _run(full_target, SECOND_RUN)
+    return mapper, _cells(str(full_dir / "target_updated.xlsx")), _cells(str(incremental_dir / "target_updated.xlsx"))
+
+
+def test_incremental_run_restores_removed_keys_like_a_full_run(tmp_path):
+    mapper, full, incremental = _full_and_incremental(tmp_path)
+
+    assert mapper.from_previous
+    assert sorted(mapper.restored) == ["F4", "G4"]
+    assert incremental == full
+    # The original formula and style come back, without the highlight
+    assert incremental["F4"] == ("=1+1", True, full["F4"][2])
+    assert incremental["F3"][0] == 150
+
+
+def test_incremental_run_starts_over_when_the_target_changed(tmp_path):
+    def add_employee(path):
+        wb = load_workbook(path)
+        ws = wb["Project"]
+        ws.insert_rows(4)
+        ws["E4"] = "Dave"
+        wb.save(path)
+
+    mapper, full, incremental = _full_and_incremental(tmp_path, add_employee)
+
+    assert not mapper.from_previous
+    assert incremental == full
+    assert incremental["E4"][0] == "Dave"
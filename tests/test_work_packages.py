@@ -0,0 +1,62 @@
+# test_work_packages.py
+import json
+import logging
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from work_packages import (  # noqa: E402
+    DEFAULT_CONFIG_PATH, WorkPackageClassifier, load_classifier, log_unmapped_report, normalize_package,
+)
+
+with open(DEFAULT_CONFIG_PATH, encoding="utf-8") as f:
+    PACKAGES = json.load(f)["packages"]
+
+
+def test_configured_labels_map_like_the_exact_lookup():
+    labels = pd.Series(list(PACKAGES) + ["999 / Unknown", None])
+
+    operations = load_classifier().classify_series(labels)
+
+    # The original mapping was labels.map(work_package_to_operation)
+    expected = labels.map(PACKAGES)
+    assert operations.where(operations.notna(), None).tolist() == expected.where(expected.notna(), None).tolist()
+
+
+def test_spacing_and_case_variants_map_to_the_same_operation():
+    classifier = WorkPackageClassifier(PACKAGES)
+
+    assert normalize_package("001 / Avature Crew  - PM/CM") == normalize_package("001/avature crew - PM/CM")
+    assert classifier.classify("001/Avature Crew - PM/CM") == "Avature Crew"
+    assert classifier.classify("  052 / avature crew -  Pre-/Onboarding ") == "Avature Preboarding"
+    assert classifier.classify("053 / Ext.Careers Portal Crew - PM / CM") == "Avature ext. Careers Portal Crew"
+
+
+def test_unknown_text_falls_back_to_an_unambiguous_package_code():
+    classifier = WorkPackageClassifier({"001 / A - PM": "Op A", "002 / B - PM": "Op B", "002 / C - PM": "Op C"},
+                                       codes={"057": "Op D"})
+
+    assert classifier.classify("001 / renamed package") == "Op A"
+    assert classifier.classify("057 / not configured by text") == "Op D"
+    # Code 002 belongs to two operations, so only the exact text matches
+    assert classifier.classify("002 / renamed package") is None
+    assert classifier.classify("002 / C - PM") == "Op C"
+    assert classifier.classify("Internal meeting") is None
+
+
+def test_unmapped_report_names_the_config_file_in_use(tmp_path, caplog):
+    path = str(tmp_path / "work_packages.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"packages": {"001 / A": "Op A"}}, f)
+    classifier = load_classifier(path)
+    report = classifier.unmapped_report(pd.Series(["001 / A", "002 / B", "002 / B"]), pd.Series([1.0, 2.0, 3.0]))
+
+    with caplog.at_level(logging.INFO, logger="operation_costs"):
+        log_unmapped_report(report, classifier.config_path)
+
+    assert report.to_dict("records") == [{"Work Package": "002 / B", "Rows": 2, "Fees": 5.0}]
+    assert os.path.relpath(path) in caplog.text
+    assert os.path.relpath(DEFAULT_CONFIG_PATH) not in caplog.text
@@ -0,0 +1,95 @@
+# test_xlsx_patch.py
+import datetime
+import os
+import re
+import sys
+import zipfile
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from xlsx_patch import XlsxPatcher  # noqa: E402
+
+SHARED_COLUMN = (
+    '<c r="B1"><f t="shared" ref="B1:B4" si="0">A1*2</f><v>2</v></c>',
+    '<c r="B2"><f t="shared" si="0"/><v>4</v></c>',
+    '<c r="B3"><f t="shared" si="0"/><v>6</v></c>',
+    '<c r="B4"><f t="shared" si="0"/><v>8</v></c>',
+)
+
+
+def _workbook_with_shared_formula(path):
+    """A1:A4 = 1..4 and B1:B4 = A*2 written as one shared formula group (as Excel does)."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Project"
+    for row in range(1, 5):
+        ws.cell(row, 1, row)
+        ws.cell(row, 2, f"=A{row}*2")
+    plain = path + ".plain"
+    wb.save(plain)
+    with zipfile.ZipFile(plain) as src, zipfile.ZipFile(path, "w") as dst:
+        for info in src.infolist():
+            data = src.read(info.filename)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                xml = data.decode("utf-8")
+                for row, shared in enumerate(SHARED_COLUMN, start=1):
+                    xml = re.sub(rf'<c r="B{row}"[^>]*>.*?</c>', shared, xml)
+                assert 't="shared"' in xml
+                data = xml.encode("utf-8")
+            dst.writestr(info, data)
+    os.remove(plain)
+
+
+def test_patching_shared_formula_master_keeps_dependent_formulas(tmp_path):
+    source = str(tmp_path / "shared.xlsx")
+    output = str(tmp_path / "shared_updated.xlsx")
+    _workbook_with_shared_formula(source)
+
+    XlsxPatcher(source, "Project").write(output, {"B1": 100})
+
+    ws = load_workbook(output)["Project"]
+    assert ws["B1"].value == 100
+    assert [ws[f"B{row}"].value for row in range(2, 5)] == ["=A2*2", "=A3*2", "=A4*2"]
+    with zipfile.ZipFile(output) as zf:
+        sheet_xml = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert 't="shared"' not in sheet_xml
+    # Cached values of the untouched formula cells survive
+    assert '<c r="B3"><f>A3*2</f><v>6</v></c>' in sheet_xml
+
+
+def test_patching_plain_cell_leaves_shared_group_untouched(tmp_path):
+    source = str(tmp_path / "shared.xlsx")
+    output = str(tmp_path / "shared_updated.xlsx")
+    _workbook_with_shared_formula(source)
+
+    XlsxPatcher(source, "Project").write(output, {"A2": 5})
+
+    with zipfile.ZipFile(output) as zf:
+        sheet_xml = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    for shared in SHARED_COLUMN:
+        assert shared in sheet_xml
+
+
+def test_patching_bools_and_dates_keeps_workbook_readable(tmp_path):
+    source = str(tmp_path / "shared.xlsx")
+    output = str(tmp_path / "shared_updated.xlsx")
+    _workbook_with_shared_formula(source)
+
+    XlsxPatcher(source, "Project").write(output, {"A1": True, "A2": False, "A3": datetime.datetime(2024, 3, 1)})
+
+    ws = load_workbook(output)["Project"]
+    assert ws["A1"].value is True
+    assert ws["A2"].value is False
+    # Dates are stored as serial numbers; the cell style decides how they are shown
+    assert ws["A3"].value == 45352
+
+
+def test_patching_unsupported_value_raises_value_error(tmp_path):
+    source = str(tmp_path / "shared.xlsx")
+    _workbook_with_shared_formula(source)
+
+    with pytest.raises(ValueError):
+        XlsxPatcher(source, "Project").write(str(tmp_path / "out.xlsx"), {"A1": object()})